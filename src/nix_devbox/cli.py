@@ -33,6 +33,9 @@ if TYPE_CHECKING:
 # Constants
 TEMP_DIR_PREFIX = "nix-devbox."
 
+# Runs of characters not allowed in a Docker image name component
+_DOCKER_NAME_INVALID_RE = re.compile(r"[^a-z0-9]+")
+
 # Module logger
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -51,7 +54,7 @@ def _sanitize_name_for_docker(value: str) -> str:
         Sanitized string safe for use as image name component
     """
     # Replace non-alphanumeric chars with hyphens, collapse multiple hyphens
-    sanitized = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+    sanitized = _DOCKER_NAME_INVALID_RE.sub("-", value.lower()).strip("-")
     return sanitized or "devbox"
 
 
@@ -352,6 +355,9 @@ def _load_devbox_config(
     4. Optional base_config is used as starting point (includes project registry)
     """
     fetcher = get_flake_fetcher()
+    # Prefetch remote flakes concurrently; the loop below then gets the cached
+    # path or the cached error, without running nix again
+    fetcher.fetch_many(ref.uri.url for ref in flake_refs if not ref.uri.is_local)
 
     # Start with base config if provided
     configs = [base_config] if base_config else []
@@ -626,6 +632,9 @@ def _make_parser(separator: str, index: int) -> Callable[[str], tuple[str, str]]
     Returns:
         Parser function suitable for _merge_mappings
     """
+    if index == 0:
+        # Most mappings are keyed by their first field
+        return lambda value: (value.partition(separator)[0], value)
     return lambda value: (extract_part_by_separator(value, separator, index), value)
 
 
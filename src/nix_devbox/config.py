@@ -2,17 +2,18 @@
 
 from __future__ import annotations
 
+import functools
+import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, TypeVar
-
-import yaml
+from types import ModuleType
+from typing import Any, Callable
 
 from .exceptions import ConfigError
-from .utils import extract_part_by_separator
 
 # Configuration file names to look for, in order of preference
 CONFIG_FILE_NAMES = ("devbox.yaml", ".devbox.yaml", "devbox.yml", ".devbox.yml")
+_CONFIG_FILE_NAME_SET = frozenset(CONFIG_FILE_NAMES)
 
 # Docker defaults
 DEFAULT_LOG_DRIVER = "json-file"
@@ -22,8 +23,25 @@ DEFAULT_REGISTRY: dict[str, str] = {
     "nix-devbox": "github:linw1995/nix-devbox?dir=examples/",
 }
 
+# Merge results keyed by the ids of the input configs (see merge_devbox_configs)
+_MERGE_CACHE: dict[tuple[int, ...], tuple[tuple[DevboxConfig, ...], DevboxConfig]] = {}
+_MERGE_CACHE_SIZE = 32
+
+# Parsed config files keyed by (device, inode, mtime_ns, size), so an
+# unchanged file is not parsed again (see DevboxConfig.from_file)
+_FILE_CACHE: dict[tuple[int, int, int, int], DevboxConfig] = {}
+_FILE_CACHE_SIZE = 32
+
+
+def _cache_put(cache: dict[Any, Any], key: Any, value: Any, size: int) -> None:
+    """Insert into a bounded cache, evicting the oldest entry when it is full."""
+    if len(cache) >= size:
+        # Dicts preserve insertion order, so the first key is the oldest
+        del cache[next(iter(cache))]
+    cache[key] = value
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SecurityConfig:
     """Security-related docker run options."""
 
@@ -39,14 +57,12 @@ class SecurityConfig:
             args.append("--read-only")
         if self.no_new_privileges:
             args.append("--security-opt=no-new-privileges:true")
-        for cap in self.cap_drop:
-            args.append(f"--cap-drop={cap}")
-        for cap in self.cap_add:
-            args.append(f"--cap-add={cap}")
+        args.extend("--cap-drop=" + cap for cap in self.cap_drop)
+        args.extend("--cap-add=" + cap for cap in self.cap_add)
         return args
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ResourcesConfig:
     """Resource limits for docker run."""
 
@@ -66,7 +82,7 @@ class ResourcesConfig:
         return args
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LoggingConfig:
     """Logging configuration for docker run."""
 
@@ -81,8 +97,8 @@ class LoggingConfig:
         # Only set log driver if explicitly configured
         if self.driver is not None:
             args.append(f"--log-driver={self.driver}")
-        for key, value in self.options.items():
-            args.append(f"--log-opt={key}={value}")
+        # %-format rather than concatenate: unquoted YAML values may be ints
+        args.extend("--log-opt=%s=%s" % item for item in self.options.items())
         return args
 
     def is_driver_explicitly_set(self) -> bool:
@@ -90,13 +106,20 @@ class LoggingConfig:
         return self.driver is not None
 
 
-@dataclass(frozen=True)
+# Shared instances returned for sections missing from a config file.
+# Configs are frozen and never mutated after parsing, so reuse is safe.
+_DEFAULT_SECURITY = SecurityConfig()
+_DEFAULT_RESOURCES = ResourcesConfig()
+_DEFAULT_LOGGING = LoggingConfig()
+
+
+@dataclass(frozen=True, slots=True)
 class RunConfig:
     """Docker run configuration for devshell environments."""
 
-    security: SecurityConfig = field(default_factory=SecurityConfig)
-    resources: ResourcesConfig = field(default_factory=ResourcesConfig)
-    logging: LoggingConfig = field(default_factory=LoggingConfig)
+    security: SecurityConfig = _DEFAULT_SECURITY
+    resources: ResourcesConfig = _DEFAULT_RESOURCES
+    logging: LoggingConfig = _DEFAULT_LOGGING
     ports: list[str] = field(default_factory=list)
     volumes: list[str] = field(default_factory=list)
     env: list[str] = field(default_factory=list)
@@ -124,28 +147,24 @@ class RunConfig:
         """
         args = self._to_non_list_docker_args()
 
-        # Add list options
-        for port in self.ports:
-            args.extend(["-p", port])
-        for volume in self.volumes:
-            args.extend(["-v", volume])
-        for e in self.env:
-            args.extend(["-e", e])
-        for tmp in self.tmpfs:
-            args.extend(["--tmpfs", tmp])
-        for arg in self.extra_args:
-            args.append(arg)
+        # Add list options as single "flag=value" arguments, the same form
+        # used when building the docker run command string
+        args.extend("-p=" + port for port in self.ports)
+        args.extend("-v=" + volume for volume in self.volumes)
+        args.extend("-e=" + e for e in self.env)
+        args.extend("--tmpfs=" + tmp for tmp in self.tmpfs)
+        args.extend(self.extra_args)
 
         return args
 
 
-T = TypeVar("T")
+_DEFAULT_RUN = RunConfig()
 
 
 def _parse_security_config(data: dict[str, Any] | None) -> SecurityConfig:
     """Parse security configuration from dict."""
-    if data is None:
-        return SecurityConfig()
+    if not data:
+        return _DEFAULT_SECURITY
     return SecurityConfig(
         read_only=data.get("read_only", False),
         no_new_privileges=data.get("no_new_privileges", False),
@@ -156,8 +175,8 @@ def _parse_security_config(data: dict[str, Any] | None) -> SecurityConfig:
 
 def _parse_resources_config(data: dict[str, Any] | None) -> ResourcesConfig:
     """Parse resources configuration from dict."""
-    if data is None:
-        return ResourcesConfig()
+    if not data:
+        return _DEFAULT_RESOURCES
     # cpus must be string (Docker CLI requirement)
     cpus = data.get("cpus")
     return ResourcesConfig(
@@ -169,20 +188,23 @@ def _parse_resources_config(data: dict[str, Any] | None) -> ResourcesConfig:
 
 def _parse_logging_config(data: dict[str, Any] | None) -> LoggingConfig:
     """Parse logging configuration from dict."""
-    if data is None:
-        return LoggingConfig()
+    if not data:
+        return _DEFAULT_LOGGING
     return LoggingConfig(
         driver=data.get("driver"),
         options=data.get("options", {}),
     )
 
 
-def _parse_run_config(data: dict[str, Any]) -> RunConfig:
+def _parse_run_config(data: dict[str, Any] | None) -> RunConfig:
     """Parse run configuration from dict.
 
     Note: Values are passed through as-is. Shell variable expansion
     ($VAR, $(cmd)) is handled by the shell when executing docker run.
     """
+    if not data:
+        return _DEFAULT_RUN
+
     # Get user config: if not specified, leave as None
     # The entrypoint will handle user switching automatically
     user = data.get("user")
@@ -200,7 +222,7 @@ def _parse_run_config(data: dict[str, Any]) -> RunConfig:
     )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class InitConfig:
     """Container initialization configuration (runs on container start)."""
 
@@ -213,22 +235,37 @@ class InitConfig:
     commands: list[str] = field(default_factory=list)
 
 
+_DEFAULT_INIT = InitConfig()
+
+
 def _parse_init_config(data: dict[str, Any] | None) -> InitConfig:
     """Parse init configuration from dict."""
-    if data is None:
-        return InitConfig()
+    if not data:
+        return _DEFAULT_INIT
     return InitConfig(
         ensure_dirs=data.get("ensure_dirs", []),
         commands=data.get("commands", []),
     )
 
 
-@dataclass(frozen=True)
+@functools.cache
+def _yaml() -> tuple[ModuleType, type]:
+    """Import PyYAML on first use and pick its safe loader.
+
+    Deferred so commands that never read a config file skip the import. The
+    libyaml-backed loader is used when PyYAML was built with it.
+    """
+    import yaml
+
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@dataclass(frozen=True, slots=True)
 class DevboxConfig:
     """Complete devbox configuration."""
 
-    run: RunConfig = field(default_factory=RunConfig)
-    init: InitConfig = field(default_factory=InitConfig)
+    run: RunConfig = _DEFAULT_RUN
+    init: InitConfig = _DEFAULT_INIT
     registry: dict[str, str] = field(default_factory=dict)
     extends: list[str] = field(default_factory=list)
     image: str | None = None
@@ -246,15 +283,29 @@ class DevboxConfig:
         Raises:
             ConfigError: If file cannot be read or parsed
         """
+        yaml, loader = _yaml()
         try:
             with open(path, encoding="utf-8") as f:
-                data = yaml.safe_load(f) or {}
+                # Stat the open file, so the key matches what gets parsed
+                st = os.fstat(f.fileno())
+                key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+                cached = _FILE_CACHE.get(key)
+                if cached is not None:
+                    return cached
+                data = yaml.load(f, Loader=loader) or {}
         except FileNotFoundError:
             return cls()
         except yaml.YAMLError as exc:
             raise ConfigError(f"Invalid YAML in {path}: {exc}") from exc
 
-        return cls.from_dict(data)
+        config = cls.from_dict(data)
+        _cache_put(_FILE_CACHE, key, config, _FILE_CACHE_SIZE)
+        return config
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Forget parsed config files, e.g. after editing one in place."""
+        _FILE_CACHE.clear()
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "DevboxConfig":
@@ -330,6 +381,28 @@ class DevboxConfig:
         return base_url
 
 
+def _find_config_file(directory: Path) -> Path | None:
+    """Return the preferred configuration file in a directory, if any.
+
+    Lists the directory once instead of probing every candidate name.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            found = {
+                entry.name
+                for entry in entries
+                if entry.name in _CONFIG_FILE_NAME_SET and entry.is_file()
+            }
+    except OSError:
+        return None
+
+    # Preserve the order of preference from CONFIG_FILE_NAMES
+    for filename in CONFIG_FILE_NAMES:
+        if filename in found:
+            return directory / filename
+    return None
+
+
 def find_config(start_path: Path) -> DevboxConfig:
     """Find and load devbox configuration.
 
@@ -345,12 +418,7 @@ def find_config(start_path: Path) -> DevboxConfig:
     Returns:
         DevboxConfig instance (empty config if no file found)
     """
-    for filename in CONFIG_FILE_NAMES:
-        config_path = start_path.parent / filename
-        if config_path.exists():
-            return DevboxConfig.from_file(config_path)
-
-    return DevboxConfig()
+    return find_config_in_directory(start_path.parent)
 
 
 def find_config_in_directory(directory: Path) -> DevboxConfig:
@@ -368,12 +436,10 @@ def find_config_in_directory(directory: Path) -> DevboxConfig:
     Returns:
         DevboxConfig instance (empty config if no file found)
     """
-    for filename in CONFIG_FILE_NAMES:
-        config_path = directory / filename
-        if config_path.exists():
-            return DevboxConfig.from_file(config_path)
-
-    return DevboxConfig()
+    config_path = _find_config_file(directory)
+    if config_path is None:
+        return DevboxConfig()
+    return DevboxConfig.from_file(config_path)
 
 
 def merge_devbox_configs(configs: list[DevboxConfig]) -> DevboxConfig:
@@ -397,26 +463,22 @@ def merge_devbox_configs(configs: list[DevboxConfig]) -> DevboxConfig:
     if len(configs) == 1:
         return configs[0]
 
+    # Configs are frozen, so identical input objects always merge to the same
+    # result. The cache entry keeps the inputs alive so their ids stay unique.
+    key = tuple(id(config) for config in configs)
+    cached = _MERGE_CACHE.get(key)
+    if cached is not None:
+        return cached[1]
+
     # Start with the first config
     merged = configs[0]
 
     for config in configs[1:]:
         merged = _merge_two_configs(merged, config)
 
-    return merged
-
-
-# Generic type variable for the pick helper
-_T = TypeVar("_T")
+    _cache_put(_MERGE_CACHE, key, (tuple(configs), merged), _MERGE_CACHE_SIZE)
 
-
-def _pick_override_or_base(override_value: _T | None, base_value: _T) -> _T:
-    """Return override_value if set, otherwise base_value.
-
-    This is a generic helper for merging scalar config values where
-    the override takes precedence over the base.
-    """
-    return override_value if override_value is not None else base_value
+    return merged
 
 
 def _merge_two_configs(base: DevboxConfig, override: DevboxConfig) -> DevboxConfig:
@@ -435,15 +497,23 @@ def _merge_two_configs(base: DevboxConfig, override: DevboxConfig) -> DevboxConf
     )
 
     # Merge resources config - override takes precedence for scalars
+    base_resources = base_run.resources
+    override_resources = override_run.resources
     merged_resources = ResourcesConfig(
-        memory=_pick_override_or_base(
-            override_run.resources.memory, base_run.resources.memory
+        memory=(
+            override_resources.memory
+            if override_resources.memory is not None
+            else base_resources.memory
         ),
-        cpus=_pick_override_or_base(
-            override_run.resources.cpus, base_run.resources.cpus
+        cpus=(
+            override_resources.cpus
+            if override_resources.cpus is not None
+            else base_resources.cpus
         ),
-        pids_limit=_pick_override_or_base(
-            override_run.resources.pids_limit, base_run.resources.pids_limit
+        pids_limit=(
+            override_resources.pids_limit
+            if override_resources.pids_limit is not None
+            else base_resources.pids_limit
         ),
     )
 
@@ -471,7 +541,7 @@ def _merge_two_configs(base: DevboxConfig, override: DevboxConfig) -> DevboxConf
         env=_merge_env(base_run.env, override_run.env),
         tmpfs=_merge_tmpfs(base_run.tmpfs, override_run.tmpfs),
         extra_args=_merge_lists(base_run.extra_args, override_run.extra_args),
-        user=_pick_override_or_base(override_run.user, base_run.user),
+        user=override_run.user if override_run.user is not None else base_run.user,
     )
 
     # Merge init config - merge ensure_dirs and commands lists
@@ -485,7 +555,7 @@ def _merge_two_configs(base: DevboxConfig, override: DevboxConfig) -> DevboxConf
     return DevboxConfig(
         run=merged_run,
         init=merged_init,
-        image=_pick_override_or_base(override.image, base.image),
+        image=override.image if override.image is not None else base.image,
     )
 
 
@@ -499,9 +569,11 @@ def _merge_lists(base: list[str], override: list[str]) -> list[str]:
     if not override:
         return list(base)
 
-    # Use dict.fromkeys() to preserve order and remove duplicates
-    # This is more concise and Pythonic than manual set tracking
-    return list(dict.fromkeys(base + override))
+    # Use dict.fromkeys() to preserve order and remove duplicates,
+    # updating in place to avoid materializing base + override
+    merged = dict.fromkeys(base)
+    merged.update(dict.fromkeys(override))
+    return list(merged)
 
 
 def _extract_volume_container_path(volume: str) -> str:
@@ -513,7 +585,7 @@ def _extract_volume_container_path(volume: str) -> str:
     Returns:
         Container path (e.g., '/container')
     """
-    return extract_part_by_separator(volume, ":", 1)
+    return volume.split(":", 2)[1] if ":" in volume else volume
 
 
 def _extract_tmpfs_path(tmpfs: str) -> str:
@@ -525,7 +597,7 @@ def _extract_tmpfs_path(tmpfs: str) -> str:
     Returns:
         Mount path (e.g., '/tmp')
     """
-    return extract_part_by_separator(tmpfs, ":", 0)
+    return tmpfs.partition(":")[0]
 
 
 def _extract_port_key(port: str) -> str:
@@ -537,7 +609,7 @@ def _extract_port_key(port: str) -> str:
     Returns:
         Host port (e.g., '8080')
     """
-    return extract_part_by_separator(port, ":", 0)
+    return port.partition(":")[0]
 
 
 def _extract_env_key(env: str) -> str:
@@ -549,7 +621,7 @@ def _extract_env_key(env: str) -> str:
     Returns:
         Variable name (e.g., 'KEY')
     """
-    return extract_part_by_separator(env, "=", 0)
+    return env.partition("=")[0]
 
 
 def _merge_by_key(
@@ -575,8 +647,8 @@ def _merge_by_key(
     if not base:
         return list(override)
 
-    # Build lookup of override keys to their full values
-    override_keys = {key_func(item): item for item in override}
+    # Only membership is needed, so collect override keys in a set
+    override_keys = {key_func(item) for item in override}
 
     # Start with base items, filtering out those that are overridden
     result = [item for item in base if key_func(item) not in override_keys]
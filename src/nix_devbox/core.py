@@ -1,6 +1,12 @@
 """Core functionality for generating flake.nix content."""
 
-from pathlib import Path
+import functools
+import io
+import os
+import posixpath
+import re
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
 
 from .models import (
     DEFAULT_WORKDIR,
@@ -14,11 +20,16 @@ _FLAKE_HEADER = "{"
 _FLAKE_INPUTS_START = """  inputs = {
     nixpkgs.url = "github:NixOS/nixpkgs/nixpkgs-unstable";"""
 _FLAKE_INPUTS_END = "  };"
-_FLAKE_OUTPUTS_START = "  outputs = {{ {inputs} }}:"
+_FLAKE_OUTPUTS_START = "  outputs = { <<INPUTS>> }:"
 _FLAKE_LET_START = """  let
     system = builtins.currentSystem;
     pkgs = import nixpkgs { inherit system; };"""
 
+# Constant chunks written verbatim by _render_flake, joined once at import
+_FLAKE_PREAMBLE = f"{_FLAKE_HEADER}\n{_FLAKE_INPUTS_START}\n"
+_FLAKE_INPUTS_CLOSE = f"{_FLAKE_INPUTS_END}\n\n"
+_FLAKE_LET_BLOCK = f"{_FLAKE_LET_START}\n\n"
+
 _FLAKE_IMAGE_PACKAGE_TEMPLATE = """
     # Create a merged shell derivation
     mergedShell = pkgs.mkShell {
@@ -96,59 +107,165 @@ _FLAKE_IMAGE_PACKAGE_TEMPLATE = """
   };
 }"""
 
+# Placeholders use <<NAME>> to avoid clashing with Nix's ${...} and braces
+_TEMPLATE_PLACEHOLDER_RE = re.compile(r"<<(\w+)>>")
 
-def _generate_shell_refs(flake_refs: list[FlakeRef]) -> str:
-    """Generate shell references for the shells list."""
-    return "\n".join(f"      shell{i}" for i in range(len(flake_refs)))
 
+@dataclass(frozen=True, slots=True)
+class _CompiledTemplate:
+    """Template pre-split into literal text and placeholder names."""
+
+    literals: tuple[str, ...]
+    keys: tuple[str, ...]
+
+    @classmethod
+    def compile(cls, template: str) -> "_CompiledTemplate":
+        """Split a <<NAME>> template once so rendering is a single join."""
+        parts = _TEMPLATE_PLACEHOLDER_RE.split(template)
+        return cls(literals=tuple(parts[::2]), keys=tuple(parts[1::2]))
+
+    def render(self, values: dict[str, str]) -> str:
+        """Fill every placeholder from values in a single pass."""
+        out = [""] * (2 * len(self.keys) + 1)
+        out[::2] = self.literals
+        out[1::2] = [values[key] for key in self.keys]
+        return "".join(out)
 
-def _generate_inputs_section(flake_refs: list[FlakeRef]) -> list[str]:
-    """Generate the inputs section of flake.nix."""
-    proj_inputs = [
-        f'    proj{i}.url = "{ref.url}";' for i, ref in enumerate(flake_refs)
-    ]
-    return [_FLAKE_INPUTS_START, *proj_inputs, _FLAKE_INPUTS_END]
 
+_OUTPUTS_START_TEMPLATE = _CompiledTemplate.compile(_FLAKE_OUTPUTS_START)
+_IMAGE_PACKAGE_TEMPLATE = _CompiledTemplate.compile(_FLAKE_IMAGE_PACKAGE_TEMPLATE)
 
-def _generate_shell_definitions(flake_refs: list[FlakeRef]) -> list[str]:
-    """Generate shell variable definitions."""
-    return [
-        f"    shell{i} = proj{i}.{ref.shell_attr};" for i, ref in enumerate(flake_refs)
-    ]
+
+@functools.lru_cache(maxsize=32)
+def _input_names(count: int) -> tuple[tuple[str, str], ...]:
+    """Return the (input name, shell variable name) pair for each flake ref."""
+    return tuple((f"proj{i}", f"shell{i}") for i in range(count))
+
+
+@functools.lru_cache(maxsize=32)
+def _generate_shell_refs(count: int) -> str:
+    """Generate shell references for the shells list."""
+    return "\n".join(f"      {shell}" for _, shell in _input_names(count))
 
 
-def _generate_inputs_args(flake_refs: list[FlakeRef]) -> str:
+def _generate_inputs_args(count: int) -> str:
     """Generate the inputs arguments for outputs function."""
     base_args = ["self", "nixpkgs"]
-    proj_args = [f"proj{i}" for i in range(len(flake_refs))]
+    proj_args = [proj for proj, _ in _input_names(count)]
     return ", ".join(base_args + proj_args)
 
 
+@functools.lru_cache(maxsize=32)
+def _generate_outputs_start(count: int) -> str:
+    """Generate the outputs function header for the given number of inputs."""
+    return _OUTPUTS_START_TEMPLATE.render({"INPUTS": _generate_inputs_args(count)})
+
+
+def _generate_proj_and_shell_block(
+    flake_refs: Sequence[FlakeRef],
+) -> tuple[str, str]:
+    """Generate the input declarations and shell variable definitions.
+
+    Both blocks come from a single pass over the flake refs.
+
+    Returns:
+        Tuple of (inputs block, shell definitions block), each line
+        newline-terminated
+    """
+    inputs: list[str] = []
+    shells: list[str] = []
+    for (proj, shell), ref in zip(_input_names(len(flake_refs)), flake_refs):
+        inputs.append(f'    {proj}.url = "{ref.url}";\n')
+        shells.append(f"    {shell} = {proj}.{ref.shell_attr};\n")
+    return "".join(inputs), "".join(shells)
+
+
+@functools.cache
+def _current_uid_gid() -> tuple[int, int]:
+    """Return the UID/GID of the current process, used for image ownership."""
+    return os.getuid(), os.getgid()
+
+
+def _normalize_mount_point(path: str) -> str:
+    """Normalize a container path: strip whitespace, root it at / and collapse
+    redundant separators."""
+    normalized = path.strip()
+    if not normalized.startswith("/"):
+        normalized = f"/{normalized}"
+    return posixpath.normpath(normalized)
+
+
+def _normalize_mount_points(paths: Iterable[str]) -> dict[str, str]:
+    """Normalize mount points once, dropping duplicates while keeping order.
+
+    Returns:
+        Mapping of each normalized path to the first original spelling of it,
+        which is what error messages show
+    """
+    normalized: dict[str, str] = {}
+    for path in paths:
+        normalized.setdefault(_normalize_mount_point(path), path)
+    return normalized
+
+
+# Parents left to the image: /tmp needs mode 1777 and /build is created by
+# buildNixShellImage
+_SKIPPED_PARENT_DIRS = frozenset({"/tmp", "/build"})
+
+
 def _collect_parent_directories(paths: list[str]) -> list[str]:
     """Collect parent directories of the given paths (excluding the paths themselves).
 
+    Directories that must keep their image-provided permissions are left out
+    (see _SKIPPED_PARENT_DIRS).
+
     Args:
-        paths: List of directory paths
+        paths: List of normalized directory paths (see _normalize_mount_points)
 
     Returns:
         Sorted list of unique parent directories, sorted by depth
     """
-    all_parents: set[str] = set()
+    # Parents bucketed by depth; the depth is tracked while stripping
+    # segments, so no per-item str.count is needed for ordering
+    by_depth: dict[int, set[str]] = {}
+    seen: set[str] = set()
 
     for path in paths:
-        # Normalize path and ensure it starts with /
-        normalized = path.strip()
-        if not normalized.startswith("/"):
-            normalized = f"/{normalized}"
-
-        # Get parent directories only (exclude the target directory itself)
-        parent = str(Path(normalized).parent)
-        while parent and parent != "/":
-            all_parents.add(parent)
-            parent = str(Path(parent).parent)
-
-    # Sort by depth (shorter paths first) to ensure parent dirs are created first
-    return sorted(all_parents, key=lambda x: (x.count("/"), x))
+        depth = path.count("/") - 1
+        # Get parent directories only (exclude the target directory itself).
+        # Stop at the first parent already seen: its ancestors are in too,
+        # so paths sharing prefixes are walked once in total.
+        parent = path.rpartition("/")[0]
+        while parent and parent != "/" and parent not in seen:
+            seen.add(parent)
+            if parent not in _SKIPPED_PARENT_DIRS:
+                by_depth.setdefault(depth, set()).add(parent)
+            depth -= 1
+            parent = parent.rpartition("/")[0]
+
+    # Shallower parents first so parent dirs are created before children
+    result: list[str] = []
+    for depth in sorted(by_depth):
+        result.extend(sorted(by_depth[depth]))
+    return result
+
+
+# "<reserved>/" prefixes, so str.startswith can check them all in one call
+_RESERVED_PREFIXES = tuple(f"{reserved}/" for reserved in RESERVED_PATHS)
+
+
+def _check_reserved_path(normalized: str, path: str) -> None:
+    """Raise ValueError if a normalized mount point is under RESERVED_PATHS."""
+    if normalized in RESERVED_PATHS or normalized.startswith(_RESERVED_PREFIXES):
+        # Only the error path needs to know which reserved path matched
+        reserved = next(
+            r
+            for r in RESERVED_PATHS
+            if normalized == r or normalized.startswith(f"{r}/")
+        )
+        raise ValueError(
+            f"Mount point '{path}' conflicts with reserved path '{reserved}'."
+        )
 
 
 def _validate_mount_point(path: str) -> str:
@@ -166,17 +283,17 @@ def _validate_mount_point(path: str) -> str:
     Raises:
         ValueError: If path is under RESERVED_PATHS
     """
-    normalized = path.strip()
-    if not normalized.startswith("/"):
-        normalized = f"/{normalized}"
+    _check_reserved_path(_normalize_mount_point(path), path)
+    return path
 
-    for reserved in RESERVED_PATHS:
-        if normalized == reserved or normalized.startswith(f"{reserved}/"):
-            raise ValueError(
-                f"Mount point '{path}' conflicts with reserved path '{reserved}'."
-            )
 
-    return path
+# fakeRootCommands script pieces (lines are indented to sit inside the template)
+_EXTRA_COMMANDS_SEPARATOR = "\n        "
+_EXTRA_COMMANDS_START = (
+    "# Create mount point directories with correct ownership"
+    f"{_EXTRA_COMMANDS_SEPARATOR}echo '=== fakeRootCommands START ===' >&2"
+)
+_EXTRA_COMMANDS_END = "echo '=== fakeRootCommands END ===' >&2"
 
 
 def _generate_extra_commands(mount_points: list[str], uid: int, gid: int) -> str:
@@ -189,7 +306,7 @@ def _generate_extra_commands(mount_points: list[str], uid: int, gid: int) -> str
     homeDirectory) and should not be created/modified here.
 
     Args:
-        mount_points: List of directory paths to create
+        mount_points: List of normalized directory paths to create
         uid: User ID for directory ownership
         gid: Group ID for directory ownership
 
@@ -202,79 +319,95 @@ def _generate_extra_commands(mount_points: list[str], uid: int, gid: int) -> str
     # Collect parent directories only (mount points themselves are created by docker)
     all_dirs = _collect_parent_directories(mount_points)
 
-    lines = [
-        "# Create mount point directories with correct ownership",
-        "echo '=== fakeRootCommands START ===' >&2",
-    ]
+    # Ownership is the same for every directory, format it once
+    chown = f"chown {uid}:{gid}"
+    sep = _EXTRA_COMMANDS_SEPARATOR
 
-    for dir_path in all_dirs:
-        # Skip /tmp (needs special permissions 1777)
-        # Skip /build itself (already created by buildNixShellImage with special permissions)
-        if dir_path == "/tmp" or dir_path == "/build":
-            continue
-
-        # Create directory and set ownership (chown works in fakeroot)
-        lines.append(f"echo 'Create directory {dir_path}' >&2")
-        lines.append(f"mkdir -p '.{dir_path}' >&2")
-        lines.append(f"chown {uid}:{gid} '.{dir_path}' >&2")
-
-    lines.append("echo '=== fakeRootCommands END ===' >&2")
+    # Create each directory and set ownership (chown works in fakeroot)
+    body = "".join(
+        f"{sep}echo 'Create directory {d}' >&2"
+        f"{sep}mkdir -p '.{d}' >&2"
+        f"{sep}{chown} '.{d}' >&2"
+        for d in all_dirs
+    )
 
-    return "\n        ".join(lines)
+    return f"{_EXTRA_COMMANDS_START}{body}{sep}{_EXTRA_COMMANDS_END}"
 
 
-def generate_flake(
-    flake_refs: list[FlakeRef],
+@functools.lru_cache(maxsize=32)
+def _render_flake(
+    flake_refs: tuple[FlakeRef, ...],
     image_ref: ImageRef,
-    mount_points: list[str] | None = None,
+    mount_points: tuple[str, ...],
+    uid: int,
+    gid: int,
 ) -> str:
-    """Generate flake.nix content from flake references."""
-    if not flake_refs:
-        raise ValueError("At least one flake reference is required")
-
-    lines = [_FLAKE_HEADER]
-    lines.extend(_generate_inputs_section(flake_refs))
-    lines.append("")
-
-    inputs_args = _generate_inputs_args(flake_refs)
-    lines.append(_FLAKE_OUTPUTS_START.format(inputs=inputs_args))
-    lines.extend(_FLAKE_LET_START.split("\n"))
-    lines.append("")
-
-    lines.extend(_generate_shell_definitions(flake_refs))
-
-    # Get UID/GID from current runtime environment
-    import os as _os
+    """Render flake.nix content.
 
-    uid = _os.getuid()
-    gid = _os.getgid()
+    The output depends only on the arguments, so repeated generations for
+    the same project are served from the cache.
+    """
     uid_str = str(uid)
     gid_str = str(gid)
 
-    # Collect and validate mount points
-    all_mount_points = list(mount_points) if mount_points else []
-    if DEFAULT_WORKDIR not in all_mount_points:
-        all_mount_points.append(DEFAULT_WORKDIR)
+    # Normalize mount points once; the same paths are validated and used
+    # to collect parent directories. The de-duplicating pass also guarantees
+    # DEFAULT_WORKDIR appears exactly once.
+    all_mount_points = _normalize_mount_points([*mount_points, DEFAULT_WORKDIR])
 
     # Validate mount points (raises error if conflicts with RESERVED_PATHS)
-    for p in all_mount_points:
-        _validate_mount_point(p)
+    for normalized, path in all_mount_points.items():
+        _check_reserved_path(normalized, path)
 
     # Generate extraCommands script for creating mount points
-    extra_commands = _generate_extra_commands(all_mount_points, uid, gid)
-
-    # Use string replace instead of format to avoid escaping issues
-    image_package = _FLAKE_IMAGE_PACKAGE_TEMPLATE
-    image_package = image_package.replace(
-        "<<SHELL_REFS>>", _generate_shell_refs(flake_refs)
+    extra_commands = _generate_extra_commands(list(all_mount_points), uid, gid)
+
+    image_package = _IMAGE_PACKAGE_TEMPLATE.render(
+        {
+            "SHELL_REFS": _generate_shell_refs(len(flake_refs)),
+            "NAME": image_ref.name,
+            "TAG": image_ref.tag,
+            "UID": uid_str,
+            "GID": gid_str,
+            "WORKDIR": DEFAULT_WORKDIR,
+            "EXTRA_COMMANDS": extra_commands,
+        }
     )
-    image_package = image_package.replace("<<NAME>>", image_ref.name)
-    image_package = image_package.replace("<<TAG>>", image_ref.tag)
-    image_package = image_package.replace("<<UID>>", uid_str)
-    image_package = image_package.replace("<<GID>>", gid_str)
-    image_package = image_package.replace("<<WORKDIR>>", DEFAULT_WORKDIR)
-    image_package = image_package.replace("<<EXTRA_COMMANDS>>", extra_commands)
 
-    lines.append(image_package)
+    inputs_block, shells_block = _generate_proj_and_shell_block(flake_refs)
+
+    buf = io.StringIO()
+    # Header and inputs section
+    buf.write(_FLAKE_PREAMBLE)
+    buf.write(inputs_block)
+    buf.write(_FLAKE_INPUTS_CLOSE)
+
+    # Outputs function with shell variable definitions
+    buf.write(_generate_outputs_start(len(flake_refs)))
+    buf.write("\n")
+    buf.write(_FLAKE_LET_BLOCK)
+    buf.write(shells_block)
+
+    buf.write(image_package)
+    return buf.getvalue()
+
+
+def generate_flake(
+    flake_refs: list[FlakeRef],
+    image_ref: ImageRef,
+    mount_points: list[str] | None = None,
+) -> str:
+    """Generate flake.nix content from flake references."""
+    if not flake_refs:
+        raise ValueError("At least one flake reference is required")
 
-    return "\n".join(lines)
+    # Get UID/GID from current runtime environment
+    uid, gid = _current_uid_gid()
+
+    return _render_flake(
+        tuple(flake_refs),
+        image_ref,
+        tuple(mount_points) if mount_points else (),
+        uid,
+        gid,
+    )
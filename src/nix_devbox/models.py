@@ -1,16 +1,28 @@
 """Domain models for nix-devbox."""
 
+import functools
 import json
+import os
+import re
 import subprocess
+import sys
+import time
+from collections.abc import Iterable
 from dataclasses import dataclass
 from pathlib import Path
-from urllib.parse import parse_qs, urlparse
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
 
 DEFAULT_TAG = "latest"
 
 # Flake shell attribute patterns
-DEFAULT_SHELL_ATTR = "devShells.${system}.default"
+# Interned: not an identifier-like literal, so not interned automatically
+DEFAULT_SHELL_ATTR = sys.intern("devShells.${system}.default")
 DEVSHELLS_PREFIX = "devShells."
+# Prefix for bare shell names, e.g. "nodejs" -> "devShells.${system}.nodejs"
+_SHELL_ATTR_PREFIX = f"{DEVSHELLS_PREFIX}${{system}}."
 
 # Default container paths
 DEFAULT_WORKDIR = "/workspace"
@@ -41,7 +53,38 @@ REMOTE_SCHEMES = frozenset(
 )
 
 
-@dataclass(frozen=True)
+def _find_query_param(query: str, name: str) -> str | None:
+    """Return the first non-blank value of a query parameter.
+
+    Matches parse_qs semantics for a single key: fields are separated by "&",
+    fields without a value are skipped, and the value is unquoted.
+    """
+    for field in query.split("&"):
+        key, _, value = field.partition("=")
+        if value and _unquote_query(key) == name:
+            return _unquote_query(value)
+    return None
+
+
+def _unquote_query(text: str) -> str:
+    """Unquote a query component, skipping the decoder for plain text."""
+    if "%" in text or "+" in text:
+        # Imported here: encoded queries are rare, and urllib.parse is
+        # otherwise not needed on the CLI's startup path
+        from urllib.parse import unquote_plus
+
+        return unquote_plus(text)
+    return text
+
+
+# Docker image reference grammar. Names may carry a registry host (with port)
+# and path components; tags follow Docker's tag rules. Anything else (quotes,
+# whitespace, "$") could escape the string literals in the generated flake.nix.
+_IMAGE_NAME_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._/:-]*")
+_IMAGE_TAG_RE = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]{0,127}")
+
+
+@dataclass(frozen=True, slots=True)
 class FlakeURI:
     """Flake URI parser supporting various URL formats."""
 
@@ -61,41 +104,25 @@ class FlakeURI:
             github:owner/repo/ref?dir=x -> github:owner/repo/ref with subdir
             git+https://...             -> git+https://...
             https://...                 -> https://...
-        """
-        ref = ref.strip()
-        if not ref:
-            raise ValueError("Flake reference cannot be empty")
-
-        # Split path/shell if there's a #
-        if "#" in ref:
-            url_part, _, _ = ref.partition("#")
-        else:
-            url_part = ref
 
-        # Check if it's a remote URL (has scheme and doesn't start with /)
-        if ":" in url_part and not url_part.startswith("/"):
-            return cls._parse_remote(url_part)
-
-        # Otherwise treat as local path
-        return cls._parse_local(url_part)
+        Results are cached, see _parse_flake_uri.
+        """
+        return _parse_flake_uri(ref, os.getcwd())
 
     @classmethod
     def _parse_remote(cls, url: str) -> "FlakeURI":
         """Parse a remote URL, extracting subdir if present."""
-        scheme = url.split(":", 1)[0].lower()
+        # Interned so the REMOTE_SCHEMES lookup can match by identity
+        scheme = sys.intern(url.partition(":")[0].lower())
 
-        # Check if it's a known remote scheme
-        is_known = any(
-            scheme == s or scheme.startswith(f"{s}+") for s in REMOTE_SCHEMES
-        )
-        if not is_known:
+        # Check if it's a known remote scheme ("git+https" -> "git")
+        if scheme.partition("+")[0] not in REMOTE_SCHEMES:
             # Unknown scheme, treat as local path with colon
             return cls._parse_local(url)
 
-        # Parse query parameters for ?dir=
-        parsed = urlparse(url)
-        query_params = parse_qs(parsed.query)
-        subdir = query_params.get("dir", [None])[0]
+        # Only ?dir= is needed, so scan the query instead of urlparse/parse_qs
+        _, has_query, query = url.partition("?")
+        subdir = _find_query_param(query, "dir") if has_query else None
 
         return cls(
             raw=url,
@@ -107,8 +134,8 @@ class FlakeURI:
     @classmethod
     def _parse_local(cls, path: str) -> "FlakeURI":
         """Parse a local path, converting to absolute path."""
-        resolved = Path(path).resolve()
-        abs_path = str(resolved)
+        # os.path.realpath works on str directly, no Path objects per call
+        abs_path = os.path.realpath(path)
 
         # Add path: prefix if not present
         if not abs_path.startswith("path:"):
@@ -124,13 +151,45 @@ class FlakeURI:
         )
 
 
-@dataclass(frozen=True)
+@functools.lru_cache(maxsize=256)
+def _parse_flake_uri(ref: str, cwd: str) -> FlakeURI:
+    """Parse a flake URI, memoized by input string.
+
+    Local paths are resolved against the working directory, so cwd is part
+    of the cache key (see _parse_flake_ref).
+    """
+    ref = ref.strip()
+    if not ref:
+        raise ValueError("Flake reference cannot be empty")
+
+    # Split path/shell if there's a #
+    if "#" in ref:
+        url_part, _, _ = ref.partition("#")
+    else:
+        url_part = ref
+
+    # Check if it's a remote URL (has scheme and doesn't start with /)
+    if ":" in url_part and not url_part.startswith("/"):
+        return FlakeURI._parse_remote(url_part)
+
+    # Otherwise treat as local path
+    return FlakeURI._parse_local(url_part)
+
+
+@dataclass(frozen=True, slots=True)
 class ImageRef:
     """Docker image reference with name and tag."""
 
     name: str
     tag: str
 
+    def __post_init__(self) -> None:
+        """Validate name and tag once, so templates can substitute them as-is."""
+        if not _IMAGE_NAME_RE.fullmatch(self.name):
+            raise ValueError(f"Invalid image name: {self.name!r}")
+        if not _IMAGE_TAG_RE.fullmatch(self.tag):
+            raise ValueError(f"Invalid image tag: {self.tag!r}")
+
     def __str__(self) -> str:
         """Return image reference as 'name:tag' string."""
         return f"{self.name}:{self.tag}"
@@ -143,23 +202,47 @@ class ImageRef:
         name_override: str | None = None,
         tag_override: str | None = None,
     ) -> "ImageRef":
-        """Parse image reference from string like 'name:tag' or 'name'."""
-        if not value or not value.strip():
-            raise ValueError("Image reference cannot be empty")
+        """Parse image reference from string like 'name:tag' or 'name'.
 
-        # Use partition for cleaner splitting (EAFP style)
-        # partition always returns 3 parts: (before, separator, after)
-        name, sep, tag = value.partition(":")
-        if not sep:
-            tag = DEFAULT_TAG
+        The name may include a registry host with port, e.g.
+        'localhost:5000/name:tag'.
 
-        return cls(
-            name=name_override or name,
-            tag=tag_override or tag,
-        )
+        Results are cached, see _parse_image_ref.
+        """
+        return _parse_image_ref(value, name_override, tag_override)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_image_ref(
+    value: str, name_override: str | None, tag_override: str | None
+) -> ImageRef:
+    """Parse an image reference, memoized by its arguments.
 
+    ImageRef is frozen, so sharing instances between callers is safe.
+    """
+    # Both parts overridden: the value is never used
+    if name_override and tag_override:
+        return ImageRef(name=name_override, tag=tag_override)
 
-@dataclass(frozen=True)
+    # Strip once and keep the result, so surrounding whitespace never
+    # leaks into the name or tag
+    value = value.strip() if value else ""
+    if not value:
+        raise ValueError("Image reference cannot be empty")
+
+    # The tag follows the last colon; a colon followed by "/" belongs to
+    # a registry port (e.g. "localhost:5000/image"), not a tag
+    name, sep, tag = value.rpartition(":")
+    if not sep or "/" in tag:
+        name, tag = value, DEFAULT_TAG
+
+    return ImageRef(
+        name=name_override or name,
+        tag=tag_override or tag,
+    )
+
+
+@dataclass(frozen=True, slots=True)
 class FlakeRef:
     """Flake reference with URI and shell attribute."""
 
@@ -193,11 +276,10 @@ class FlakeRef:
             github:owner/repo           -> (uri, devShells.${system}.default)
             github:owner/repo#shell     -> (uri, devShells.${system}.shell)
             github:owner/repo?dir=subdir#shell -> (uri, subdir.devShells.${system}.shell)
-        """
-        if "#" not in ref:
-            return cls._from_url_only(ref)
 
-        return cls._from_url_with_shell(ref)
+        Results are cached, see _parse_flake_ref.
+        """
+        return _parse_flake_ref(ref, os.getcwd())
 
     @classmethod
     def _from_url_only(cls, ref: str) -> "FlakeRef":
@@ -214,7 +296,7 @@ class FlakeRef:
         url_part, _, shell = ref.partition("#")
 
         if not shell.startswith(DEVSHELLS_PREFIX) and "." not in shell:
-            shell = f"{DEVSHELLS_PREFIX}${{system}}.{shell}"
+            shell = _SHELL_ATTR_PREFIX + shell
 
         uri = FlakeURI.parse(url_part)
         return cls(uri=uri, shell=shell)
@@ -224,18 +306,135 @@ class FlakeRef:
         return f"{self.uri.raw}#{self.shell}"
 
 
+@functools.lru_cache(maxsize=256)
+def _parse_flake_ref(ref: str, cwd: str) -> FlakeRef:
+    """Parse a flake reference, memoized by input string.
+
+    Local paths are resolved against the working directory, so cwd is part
+    of the cache key. Symlinks are assumed not to change while the process
+    runs; call _parse_flake_ref.cache_clear() if they do.
+    """
+    if "#" not in ref:
+        return FlakeRef._from_url_only(ref)
+
+    return FlakeRef._from_url_with_shell(ref)
+
+
+# Upper bound on concurrent `nix flake prefetch` processes in fetch_many
+FETCH_MAX_WORKERS = 8
+
+# How long a persisted prefetch result is trusted, matching Nix's default
+# tarball-ttl: unpinned refs (branches) may move after that
+FETCH_CACHE_TTL = 3600
+
+# How long a failed prefetch is raised again instead of retried: long enough
+# for one command to not repeat it, short enough for a transient error to
+# clear
+FETCH_FAILURE_TTL = 30
+
+
+def default_fetch_cache_file() -> Path:
+    """Return the on-disk fetch cache location under $XDG_CACHE_HOME."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache_home) / "nix-devbox" / "fetch-cache.json"
+
+
 class RemoteFlakeFetcher:
     """Fetch remote flakes and provide access to their files."""
 
-    def __init__(self) -> None:
-        """Initialize the fetcher with an empty cache."""
-        self._cache: dict[str, Path] = {}
+    def __init__(self, cache_file: Path | None = None) -> None:
+        """Initialize the fetcher.
+
+        Args:
+            cache_file: Optional JSON file persisting fetch results between
+                runs. Without it the cache only lives in memory.
+        """
+        # Imported here, like tempfile and concurrent.futures below, so that
+        # importing the models stays cheap
+        import threading
+
+        # Store paths are kept as str and wrapped in Path on return; this is
+        # also the form they are persisted in
+        self._cache: dict[str, str] = {}
+        self._cache_file = cache_file
+        # (url, filename) -> path if the file exists, from get_file_path
+        self._file_cache: dict[tuple[str, str], str | None] = {}
+        # url -> pending result of the fetch currently running for it
+        self._inflight: dict[str, Future[str]] = {}
+        # url -> (error, time.monotonic() of the failure) for recent failed
+        # fetches, raised again instead of refetching (see FETCH_FAILURE_TTL)
+        self._failures: dict[str, tuple[Exception, float]] = {}
+        # Guards the caches, in-flight fetches and the cache file, since
+        # fetch_many calls fetch from several threads
+        self._lock = threading.Lock()
+        # url -> {"storePath": str, "fetchedAt": float}
+        self._persisted: dict[str, dict] = (
+            self._load_persisted(cache_file) if cache_file else {}
+        )
+
+    @staticmethod
+    def _load_persisted(cache_file: Path) -> dict[str, dict]:
+        """Read the persisted cache, treating a missing or broken file as empty."""
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _lookup_persisted(self, url: str) -> str | None:
+        """Return a persisted store path if it is fresh and still in the store."""
+        entry = self._persisted.get(url)
+        if not isinstance(entry, dict):
+            return None
+        try:
+            fetched_at = float(entry["fetchedAt"])
+            store_path = entry["storePath"]
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not isinstance(store_path, str):
+            return None
+        if time.time() - fetched_at > FETCH_CACHE_TTL:
+            return None
+        # The Nix garbage collector may have removed it since
+        return store_path if os.path.exists(store_path) else None
+
+    def _persist(self, url: str, store_path: str) -> None:
+        """Record a fetch result and write the cache file atomically."""
+        if self._cache_file is None:
+            return
+        # Imported here: only runs after a successful prefetch
+        import tempfile
+
+        with self._lock:
+            self._persisted[url] = {
+                "storePath": store_path,
+                "fetchedAt": time.time(),
+            }
+            cache_dir = self._cache_file.parent
+            tmp_name = None
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=cache_dir, delete=False
+                ) as f:
+                    tmp_name = f.name
+                    json.dump(self._persisted, f)
+                os.replace(tmp_name, self._cache_file)
+            except OSError:
+                # The cache is an optimization; failing to write it is not fatal
+                if tmp_name is not None:
+                    Path(tmp_name).unlink(missing_ok=True)
 
     def fetch(self, url: str) -> Path:
         """Fetch a remote flake and return the local store path.
 
         Uses nix flake prefetch to download the flake and cache it.
-        Subsequent calls with the same URL return the cached path.
+        Subsequent calls with the same URL return the cached path; a fetch
+        that failed less than FETCH_FAILURE_TTL ago raises its error again
+        without retrying. With a cache file, results younger than
+        FETCH_CACHE_TTL are reused across runs as long as the store path
+        still exists.
 
         Args:
             url: The flake URL (e.g., "github:owner/repo/ref")
@@ -246,25 +445,108 @@ class RemoteFlakeFetcher:
         Raises:
             RuntimeError: If the fetch fails
         """
-        if url in self._cache:
-            return self._cache[url]
+        # Single flight: concurrent callers for the same URL share one fetch
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached is not None:
+                return Path(cached)
+            failure = self._failures.get(url)
+            if failure is not None:
+                error, failed_at = failure
+                if time.monotonic() - failed_at < FETCH_FAILURE_TTL:
+                    raise error
+                del self._failures[url]
+            pending = self._inflight.get(url)
+            if pending is None:
+                # Imported here: only needed once a fetch actually runs
+                from concurrent.futures import Future
+
+                owned: Future[str] = Future()
+                self._inflight[url] = owned
+
+        if pending is not None:
+            return Path(pending.result())
+
+        try:
+            store_path = self._fetch_uncached(url)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                with self._lock:
+                    self._failures[url] = (e, time.monotonic())
+            owned.set_exception(e)
+            raise
+        else:
+            owned.set_result(store_path)
+        finally:
+            with self._lock:
+                del self._inflight[url]
+        return Path(store_path)
+
+    def _fetch_uncached(self, url: str) -> str:
+        """Resolve a URL from the persisted cache or nix, caching the result."""
+        store_path = self._lookup_persisted(url)
+        if store_path is not None:
+            with self._lock:
+                self._cache[url] = store_path
+            return store_path
 
         try:
             result = subprocess.run(
                 ["nix", "flake", "prefetch", "--json", url],
                 capture_output=True,
-                text=True,
                 check=True,
             )
+            # json.loads takes bytes directly, no separate decode of stdout
             data = json.loads(result.stdout)
-            store_path = Path(data["storePath"])
-            self._cache[url] = store_path
-            return store_path
+            store_path = data["storePath"]
         except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Failed to fetch flake {url}: {e.stderr}") from e
-        except (json.JSONDecodeError, KeyError) as e:
+            stderr = e.stderr.decode(errors="replace") if e.stderr else ""
+            raise RuntimeError(f"Failed to fetch flake {url}: {stderr}") from e
+        except (ValueError, KeyError) as e:
             raise RuntimeError(f"Invalid response from nix prefetch: {e}") from e
 
+        with self._lock:
+            self._cache[url] = store_path
+        self._persist(url, store_path)
+        return store_path
+
+    def fetch_many(self, urls: Iterable[str]) -> dict[str, Path]:
+        """Fetch several remote flakes concurrently.
+
+        Uncached URLs are prefetched in parallel (up to FETCH_MAX_WORKERS
+        processes), so the wall time is that of the slowest fetch rather
+        than the sum. Use it to warm the cache before calling fetch().
+
+        Args:
+            urls: The flake URLs to fetch
+
+        Returns:
+            Mapping of URL to store path. URLs that failed to fetch are left
+            out; calling fetch() on them soon after raises the error without
+            retrying (see FETCH_FAILURE_TTL).
+        """
+        urls = list(dict.fromkeys(urls))
+        pending = [url for url in urls if url not in self._cache]
+
+        if len(pending) > 1:
+            # Imported here: the thread pool is only needed for several URLs
+            from concurrent.futures import ThreadPoolExecutor
+
+            workers = min(FETCH_MAX_WORKERS, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self._try_fetch, pending))
+        elif pending:
+            self._try_fetch(pending[0])
+
+        return {url: Path(self._cache[url]) for url in urls if url in self._cache}
+
+    def _try_fetch(self, url: str) -> Path | None:
+        """Fetch a flake, returning None if nix fails or is unavailable."""
+        try:
+            return self.fetch(url)
+        except (RuntimeError, FileNotFoundError):
+            return None
+
     def get_file_path(self, url: str, filename: str) -> Path | None:
         """Get the path to a specific file in a remote flake.
 
@@ -275,13 +557,29 @@ class RemoteFlakeFetcher:
         Returns:
             Path to the file if it exists, None otherwise
         """
-        flake_path = self.fetch(url)
-        file_path = flake_path / filename
-        return file_path if file_path.exists() else None
+        key = (url, filename)
+        if key in self._file_cache:
+            file_path = self._file_cache[key]
+        else:
+            file_path = os.path.join(self.fetch(url), filename)
+            # Store paths are immutable, so the existence check can be cached
+            if not os.path.exists(file_path):
+                file_path = None
+            self._file_cache[key] = file_path
+        return Path(file_path) if file_path is not None else None
 
     def clear_cache(self) -> None:
-        """Clear the fetch cache."""
-        self._cache.clear()
+        """Clear the fetch cache, including the persisted one."""
+        with self._lock:
+            self._cache.clear()
+            self._file_cache.clear()
+            self._failures.clear()
+            self._persisted.clear()
+            if self._cache_file is not None:
+                try:
+                    self._cache_file.unlink(missing_ok=True)
+                except OSError:
+                    pass
 
 
 # Global fetcher instance for reuse across the application
@@ -292,5 +590,5 @@ def get_flake_fetcher() -> RemoteFlakeFetcher:
     """Get the global flake fetcher instance."""
     global _flake_fetcher
     if _flake_fetcher is None:
-        _flake_fetcher = RemoteFlakeFetcher()
+        _flake_fetcher = RemoteFlakeFetcher(default_fetch_cache_file())
     return _flake_fetcher
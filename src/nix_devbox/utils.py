@@ -19,8 +19,11 @@ def expand_flagged_options(flag: str, items: list[str] | None) -> list[str]:
     """
     if not items:
         return []
-    # Use list comprehension with nested loops for flat list
-    return [pair for item in items for pair in (flag, item)]
+    # Pre-size the result with the flag and fill the value slots in one
+    # slice assignment, no per-item tuples or list growth
+    result = [flag] * (2 * len(items))
+    result[1::2] = items
+    return result
 
 
 def extract_part_by_separator(value: str, separator: str, index: int = 0) -> str:
@@ -42,5 +45,12 @@ def extract_part_by_separator(value: str, separator: str, index: int = 0) -> str
         >>> extract_part_by_separator('KEY=value', '=', 0)
         'KEY'
     """
-    parts = value.split(separator)
+    # partition avoids building the full list for the common leading fields
+    if index == 0:
+        return value.partition(separator)[0]
+    if index == 1:
+        _, sep, rest = value.partition(separator)
+        return rest.partition(separator)[0] if sep else value
+    parts = value.split(separator, index + 1)
     return parts[index] if len(parts) > index else value
+
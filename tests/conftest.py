@@ -0,0 +1,33 @@
+"""Shared fixtures for the nix-devbox test suite."""
+
+import shutil
+
+import pytest
+
+from nix_devbox.core import generate_flake
+from nix_devbox.models import FlakeRef, ImageRef
+
+
+@pytest.fixture(scope="session")
+def basic_flake() -> str:
+    """Flake for a single local project with default mount points."""
+    return generate_flake(
+        [FlakeRef.parse("/path/to/project")], ImageRef.parse("test:latest")
+    )
+
+
+def pytest_configure(config):
+    """Register the markers used by the suite."""
+    config.addinivalue_line(
+        "markers", "requires_nix: test runs the nix CLI and is skipped without it"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip requires_nix tests when nix is missing, probing only if selected."""
+    selected = [item for item in items if item.get_closest_marker("requires_nix")]
+    if not selected or shutil.which("nix") is not None:
+        return
+    skip = pytest.mark.skip(reason="Nix not installed")
+    for item in selected:
+        item.add_marker(skip)
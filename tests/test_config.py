@@ -16,6 +16,7 @@ from nix_devbox.config import (
     _parse_run_config,
     _parse_security_config,
     find_config,
+    find_config_in_directory,
 )
 
 
@@ -101,6 +102,10 @@ class TestLoggingConfig:
         assert "--log-opt=max-size=10m" in args
         assert "--log-opt=max-file=3" in args
 
+    def test_to_docker_args_non_string_option(self):
+        cfg = LoggingConfig(options={"max-file": 3})
+        assert cfg.to_docker_args() == ["--log-opt=max-file=3"]
+
 
 class TestRunConfig:
     """Tests for RunConfig."""
@@ -118,28 +123,22 @@ class TestRunConfig:
     def test_to_docker_args_with_ports(self):
         cfg = RunConfig(ports=["8080:80", "8443:443"])
         args = cfg.to_docker_args()
-        assert "-p" in args
-        assert "8080:80" in args
-        assert "8443:443" in args
+        assert args == ["-p=8080:80", "-p=8443:443"]
 
     def test_to_docker_args_with_volumes(self):
         cfg = RunConfig(volumes=["./data:/app/data"])
         args = cfg.to_docker_args()
-        assert "-v" in args
-        assert "./data:/app/data" in args
+        assert args == ["-v=./data:/app/data"]
 
     def test_to_docker_args_with_env(self):
         cfg = RunConfig(env=["NODE_ENV=production"])
         args = cfg.to_docker_args()
-        assert "-e" in args
-        assert "NODE_ENV=production" in args
+        assert args == ["-e=NODE_ENV=production"]
 
     def test_to_docker_args_with_tmpfs(self):
         cfg = RunConfig(tmpfs=["/tmp:size=100m", "/var/cache"])
         args = cfg.to_docker_args()
-        assert "--tmpfs" in args
-        assert "/tmp:size=100m" in args
-        assert "/var/cache" in args
+        assert args == ["--tmpfs=/tmp:size=100m", "--tmpfs=/var/cache"]
 
 
 class TestParseHelpers:
@@ -176,6 +175,15 @@ class TestParseHelpers:
         assert cfg.resources.memory == "512m"
         assert cfg.ports == ["8080:80"]
 
+    def test_missing_sections_reuse_defaults(self):
+        first = DevboxConfig.from_dict({})
+        second = DevboxConfig.from_dict({"run": {"ports": ["8080:80"]}})
+        assert first.run == RunConfig()
+        assert first.init is second.init
+        assert DevboxConfig.from_dict({}).run is first.run
+        assert _parse_security_config(None) is second.run.security
+        assert _parse_run_config(None) == RunConfig()
+
 
 class TestDevboxConfig:
     """Tests for DevboxConfig."""
@@ -184,6 +192,12 @@ class TestDevboxConfig:
         cfg = DevboxConfig()
         assert isinstance(cfg.run, RunConfig)
 
+    def test_default_sections_are_shared(self):
+        assert DevboxConfig().run is DevboxConfig().run
+        assert DevboxConfig().init is DevboxConfig().init
+        assert RunConfig().security is RunConfig().security
+        assert RunConfig(ports=["8080:80"]).logging is RunConfig().logging
+
     def test_from_dict(self):
         data = {
             "run": {
@@ -251,6 +265,16 @@ run:
         assert cfg.image == "my-custom-image:v1.0"
         assert cfg.run.resources.memory == "256m"
 
+    def test_from_file_reuses_unchanged_file(self, tmp_path: Path):
+        config_file = tmp_path / "devbox.yaml"
+        config_file.write_text('image: "first:v1"\n')
+
+        first = DevboxConfig.from_file(config_file)
+        assert DevboxConfig.from_file(config_file) is first
+
+        config_file.write_text('image: "second-image:v2"\n')
+        assert DevboxConfig.from_file(config_file).image == "second-image:v2"
+
 
 class TestFindConfig:
     """Tests for find_config function."""
@@ -286,3 +310,18 @@ class TestFindConfig:
         cfg = find_config(flake_nix)
         # devbox.yaml should take precedence over .devbox.yaml
         assert cfg.run.resources.memory == "512m"
+
+    def test_find_yml_fallback(self, tmp_path: Path):
+        (tmp_path / "devbox.yml").write_text("run:\n  resources:\n    memory: 1g")
+        cfg = find_config_in_directory(tmp_path)
+        assert cfg.run.resources.memory == "1g"
+
+    def test_directory_named_like_config_is_ignored(self, tmp_path: Path):
+        (tmp_path / "devbox.yaml").mkdir()
+        (tmp_path / ".devbox.yaml").write_text("run:\n  resources:\n    memory: 2g")
+        cfg = find_config_in_directory(tmp_path)
+        assert cfg.run.resources.memory == "2g"
+
+    def test_missing_directory(self, tmp_path: Path):
+        cfg = find_config_in_directory(tmp_path / "missing")
+        assert cfg == DevboxConfig()
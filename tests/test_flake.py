@@ -1,30 +1,50 @@
 """Tests for flake.nix generation."""
 
 import subprocess
-import tempfile
-from pathlib import Path
 
 import pytest
 
 from nix_devbox.core import generate_flake
 from nix_devbox.models import FlakeRef, ImageRef
 
+# Both are frozen dataclasses, so tests can share them safely
+_FLAKE = FlakeRef.parse("/path/to/project")
+_IMAGE = ImageRef.parse("test:latest")
+
+
+def _lines(content: str) -> set[str]:
+    """Return the stripped lines of generated content for membership checks."""
+    return {line.strip() for line in content.splitlines()}
+
+
+def _mkdir(path: str) -> str:
+    """Return the fakeRootCommands line that creates path."""
+    return f"mkdir -p '.{path}' >&2"
+
+
+@pytest.fixture(scope="module")
+def mount_flake(request) -> str:
+    """Flake for a single local project with the mount points in request.param.
+
+    Use with indirect parametrization; tests sharing mount points share one
+    rendered flake.
+    """
+    return generate_flake([_FLAKE], _IMAGE, request.param)
+
 
 class TestFlakeGeneration:
     """Tests for flake.nix generation."""
 
-    def test_basic_flake_generation(self):
+    def test_basic_flake_generation(self, basic_flake):
         """Test basic flake.nix generation."""
-        flake_refs = [FlakeRef.parse("/path/to/project")]
-        image_ref = ImageRef.parse("test:latest")
-
-        flake_content = generate_flake(flake_refs, image_ref)
+        flake_content = basic_flake
+        lines = _lines(flake_content)
 
         assert "pkgs.writeShellScriptBin" in flake_content
         assert "entrypoint" in flake_content
-        assert 'name = "test"' in flake_content  # Image name
-        assert 'tag = "latest"' in flake_content  # Image tag
-        assert "/path/to/project" in flake_content
+        assert 'name = "test";' in lines  # Image name
+        assert 'tag = "latest";' in lines  # Image tag
+        assert 'proj0.url = "path:/path/to/project";' in lines
 
     def test_multiple_flake_refs(self):
         """Test flake generation with multiple flake references."""
@@ -32,54 +52,50 @@ class TestFlakeGeneration:
             FlakeRef.parse("/path/to/project1"),
             FlakeRef.parse("/path/to/project2#devShells.default"),
         ]
-        image_ref = ImageRef.parse("test:latest")
-
-        flake_content = generate_flake(flake_refs, image_ref)
-
-        assert "shell0" in flake_content
-        assert "shell1" in flake_content
-        assert "proj0" in flake_content
-        assert "proj1" in flake_content
-
-    def test_flake_generation(self):
+        lines = _lines(generate_flake(flake_refs, _IMAGE))
+
+        expected = {
+            'proj0.url = "path:/path/to/project1";',
+            'proj1.url = "path:/path/to/project2";',
+            "outputs = { self, nixpkgs, proj0, proj1 }:",
+            "shell0 = proj0.devShells.${system}.default;",
+            "shell1 = proj1.devShells.default;",
+        }
+        assert expected <= lines, expected - lines
+
+    def test_flake_generation(self, basic_flake):
         """Test basic flake generation."""
-        flake_refs = [FlakeRef.parse("/path/to/project")]
-        image_ref = ImageRef.parse("test:latest")
-
-        flake_content = generate_flake(flake_refs, image_ref)
+        flake_content = basic_flake
 
         # Verify basic structure
         assert "inputs = {" in flake_content
         assert "outputs = {" in flake_content
         assert "buildNixShellImage" in flake_content
 
-    def test_flake_generation_with_mount_points(self):
+    @pytest.mark.parametrize(
+        "mount_flake", [["/data", "/cache", "/home/user/.config"]], indirect=True
+    )
+    def test_flake_generation_with_mount_points(self, mount_flake):
         """Test flake generation with mount points - only parent dirs created."""
-        flake_refs = [FlakeRef.parse("/path/to/project")]
-        image_ref = ImageRef.parse("test:latest")
-        mount_points = ["/data", "/cache", "/home/user/.config"]
-
-        flake_content = generate_flake(flake_refs, image_ref, mount_points)
+        flake_content = mount_flake
+        lines = _lines(flake_content)
 
         # Verify mount point parent directories are created via fakeRootCommands
         assert "fakeRootCommands" in flake_content
         # /data and /cache are direct children of root, no parent to create
-        assert "mkdir -p './data'" not in flake_content
-        assert "mkdir -p './cache'" not in flake_content
+        assert _mkdir("/data") not in lines
+        assert _mkdir("/cache") not in lines
         # /home/user/.config has parents: /home, /home/user
-        assert "mkdir -p './home'" in flake_content
+        assert _mkdir("/home") in lines
         assert "chown" in flake_content
-        assert "mkdir -p './home/user'" in flake_content
+        assert _mkdir("/home/user") in lines
         # Mount point itself is NOT created
-        assert "mkdir -p './home/user/.config'" not in flake_content
+        assert _mkdir("/home/user/.config") not in lines
 
-    def test_flake_generation_default_mount_point(self):
+    def test_flake_generation_default_mount_point(self, basic_flake):
         """Test that default /workspace parent dirs are created."""
-        flake_refs = [FlakeRef.parse("/path/to/project")]
-        image_ref = ImageRef.parse("test:latest")
-
         # /workspace is at root level, no parent dirs to create
-        flake_content = generate_flake(flake_refs, image_ref)
+        flake_content = basic_flake
 
         assert "fakeRootCommands" in flake_content
         # /workspace has no parent dirs (except root), so no mkdir commands
@@ -87,69 +103,90 @@ class TestFlakeGeneration:
         # The mount point itself is NOT created in fakeRootCommands
         assert "chown" not in flake_content or "'./workspace'" not in flake_content
 
-    def test_flake_generation_parent_directories(self):
+    # Nested path - should create /data, /data/subdir but NOT /data/subdir/deep
+    @pytest.mark.parametrize("mount_flake", [["/data/subdir/deep"]], indirect=True)
+    def test_flake_generation_parent_directories(self, mount_flake):
         """Test that only parent directories are created, not mount points."""
-        flake_refs = [FlakeRef.parse("/path/to/project")]
-        image_ref = ImageRef.parse("test:latest")
-        # Nested path - should create /data, /data/subdir but NOT /data/subdir/deep
-        mount_points = ["/data/subdir/deep"]
-
-        flake_content = generate_flake(flake_refs, image_ref, mount_points)
+        flake_content = mount_flake
+        lines = _lines(flake_content)
 
         assert "fakeRootCommands" in flake_content
         # Parent directories should be created and chowned
-        assert "mkdir -p './data'" in flake_content
+        assert _mkdir("/data") in lines
         assert "chown" in flake_content
-        assert "mkdir -p './data/subdir'" in flake_content
+        assert _mkdir("/data/subdir") in lines
         # Mount point itself is NOT created (docker creates it when mounting)
-        assert "mkdir -p './data/subdir/deep'" not in flake_content
-
-    def test_flake_generation_excludes_special_dirs(self):
+        assert _mkdir("/data/subdir/deep") not in lines
+
+    # /tmp/cache is not under /build so it's allowed
+    @pytest.mark.parametrize(
+        "mount_flake", [["/tmp/cache", "/data/sub"]], indirect=True
+    )
+    @pytest.mark.parametrize(
+        ("path", "present"),
+        [
+            # /tmp itself should NOT be created (it needs special permissions)
+            ("/tmp", False),
+            # Mount points themselves are NOT created
+            ("/tmp/cache", False),
+            ("/data/sub", False),
+            # /data is a regular parent directory and is created
+            ("/data", True),
+        ],
+    )
+    def test_flake_generation_excludes_special_dirs(self, mount_flake, path, present):
         """Test that /tmp is excluded but other paths are handled."""
-        flake_refs = [FlakeRef.parse("/path/to/project")]
-        image_ref = ImageRef.parse("test:latest")
-        # Include paths under /tmp which should be handled specially
-        # /tmp/cache is not under /build so it's allowed
-        mount_points = ["/tmp/cache", "/data"]
+        assert "fakeRootCommands" in mount_flake
+        assert (_mkdir(path) in _lines(mount_flake)) == present
 
-        flake_content = generate_flake(flake_refs, image_ref, mount_points)
+    @pytest.mark.parametrize("mount_flake", [["/srv//app/cache/"]], indirect=True)
+    def test_flake_generation_unnormalized_mount_point(self, mount_flake):
+        """Test that trailing and doubled slashes do not create the mount point."""
+        lines = _lines(mount_flake)
 
-        assert "fakeRootCommands" in flake_content
-        # /tmp itself should NOT be created (it needs special permissions)
-        assert "mkdir -p './tmp'" not in flake_content
-        # /data has no parent (direct child of root), not created
-        assert "mkdir -p './data'" not in flake_content
+        assert _mkdir("/srv") in lines
+        assert _mkdir("/srv/app") in lines
+        assert _mkdir("/srv/app/cache") not in lines
+
+    def test_repeated_generation_is_cached(self):
+        """Test that identical inputs reuse the rendered flake."""
+        first = generate_flake([_FLAKE], _IMAGE, ["/data/cache"])
+        second = generate_flake([_FLAKE], _IMAGE, ["/data/cache"])
+
+        assert second is first
+
+    def test_reserved_mount_point_rejected(self):
+        """Test that mount points under /build are rejected on every call."""
+        for _ in range(2):
+            with pytest.raises(ValueError, match="reserved path"):
+                generate_flake([_FLAKE], _IMAGE, ["/build/.config"])
+
+    def test_reserved_mount_point_error_shows_original_path(self):
+        """Test that the error names the mount point as the user wrote it."""
+        with pytest.raises(ValueError, match="Mount point ' build/x'"):
+            generate_flake([_FLAKE], _IMAGE, [" build/x"])
 
 
-@pytest.mark.skipif(
-    subprocess.run(["which", "nix"], capture_output=True).returncode != 0,
-    reason="Nix not installed",
-)
+@pytest.mark.requires_nix
 class TestFlakeSyntax:
     """Tests for flake.nix syntax validation using Nix."""
 
-    def test_nix_instantiate_parse(self):
+    def test_nix_instantiate_parse(self, basic_flake):
         """Test that generated flake can be parsed by nix-instantiate.
 
         This validates Nix syntax without evaluating or building.
         """
-        flake_refs = [FlakeRef.parse("/tmp/test-project")]
-        image_ref = ImageRef.parse("test:latest")
-
-        flake_content = generate_flake(flake_refs, image_ref)
-
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            flake_path = Path(tmp_dir) / "flake.nix"
-            flake_path.write_text(flake_content)
-
-            # Use nix-instantiate --parse to check syntax only
-            result = subprocess.run(
-                ["nix-instantiate", "--parse", str(flake_path)],
-                capture_output=True,
-                text=True,
-            )
-
-            assert result.returncode == 0, (
-                f"Nix syntax error:\n{result.stderr}\n\n"
-                f"Generated flake:\n{flake_content[:500]}..."
-            )
+        flake_content = basic_flake
+
+        # Use nix-instantiate --parse to check syntax only; "-" reads stdin
+        result = subprocess.run(
+            ["nix-instantiate", "--parse", "-"],
+            input=flake_content,
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.returncode == 0, (
+            f"Nix syntax error:\n{result.stderr}\n\n"
+            f"Generated flake:\n{flake_content[:500]}..."
+        )
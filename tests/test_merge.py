@@ -1,13 +1,24 @@
 """Tests for configuration merging."""
 
+import pytest
+
 from nix_devbox.config import (
     DevboxConfig,
     merge_devbox_configs,
     _merge_two_configs,
     _merge_lists,
+    _merge_env,
+    _merge_ports,
+    _merge_tmpfs,
+    _merge_volumes,
 )
 
 
+def _cfg(data: dict) -> DevboxConfig:
+    """Build a fresh config from data."""
+    return DevboxConfig.from_dict(data)
+
+
 class TestMergeLists:
     """Tests for _merge_lists helper (used for extra_args)."""
 
@@ -32,151 +43,136 @@ class TestMergeLists:
         assert result == []
 
 
-class TestMergeEnv:
-    """Tests for _merge_env helper - key-based merging."""
-
-    def test_merge_no_conflict(self):
-        """Different keys should be merged."""
-        from nix_devbox.config import _merge_env
-
-        result = _merge_env(["KEY1=v1"], ["KEY2=v2"])
-        assert "KEY1=v1" in result
-        assert "KEY2=v2" in result
-
-    def test_merge_same_key_override(self):
-        """Same key should be overridden."""
-        from nix_devbox.config import _merge_env
-
-        result = _merge_env(["KEY=v1"], ["KEY=v2"])
-        assert "KEY=v2" in result
-        assert "KEY=v1" not in result
-
-    def test_merge_mixed(self):
-        """Some keys overridden, some not."""
-        from nix_devbox.config import _merge_env
-
-        base = ["VAR1=p1", "VAR2=p1", "VAR3=p1"]
-        override = ["VAR1=p2", "VAR2=p2"]
-        result = _merge_env(base, override)
-
-        assert "VAR1=p2" in result
-        assert "VAR2=p2" in result
-        assert "VAR3=p1" in result
-        assert "VAR1=p1" not in result
-        assert "VAR2=p1" not in result
-
-
-class TestMergePorts:
-    """Tests for _merge_ports helper - host port-based merging."""
-
-    def test_merge_no_conflict(self):
-        """Different host ports should be merged."""
-        from nix_devbox.config import _merge_ports
-
-        result = _merge_ports(["8080:80"], ["3000:3000"])
-        assert "8080:80" in result
-        assert "3000:3000" in result
-
-    def test_merge_same_host_port_override(self):
-        """Same host port should be overridden."""
-        from nix_devbox.config import _merge_ports
-
-        result = _merge_ports(["8080:80"], ["8080:8080"])
-        assert "8080:8080" in result
-        assert "8080:80" not in result
-
-    def test_merge_with_host_only(self):
-        """Host-only port format."""
-        from nix_devbox.config import _merge_ports
-
-        result = _merge_ports(["8080"], ["8080:80"])
-        assert "8080:80" in result
-        assert "8080" not in result
-
-
-class TestMergeTmpfs:
-    """Tests for _merge_tmpfs helper - path-based merging."""
-
-    def test_merge_no_conflict(self):
-        """Different paths should be merged."""
-        from nix_devbox.config import _merge_tmpfs
-
-        result = _merge_tmpfs(["/tmp:size=100m"], ["/var/cache"])
-        assert "/tmp:size=100m" in result
-        assert "/var/cache" in result
-
-    def test_merge_same_path_override(self):
-        """Same path should be overridden."""
-        from nix_devbox.config import _merge_tmpfs
-
-        result = _merge_tmpfs(["/tmp:size=100m"], ["/tmp:size=200m"])
-        assert "/tmp:size=200m" in result
-        assert "/tmp:size=100m" not in result
-
-    def test_merge_mixed(self):
-        """Some paths overridden, some not."""
-        from nix_devbox.config import _merge_tmpfs
-
-        base = ["/tmp:size=100m", "/var/cache:size=50m", "/run"]
-        override = ["/tmp:size=200m", "/run:size=100m"]
-        result = _merge_tmpfs(base, override)
-
-        # /tmp and /run overridden
-        assert "/tmp:size=200m" in result
-        assert "/run:size=100m" in result
-        # /var/cache preserved
-        assert "/var/cache:size=50m" in result
-        # Old values gone
-        assert "/tmp:size=100m" not in result
-        assert "/run" not in result
+class TestMergeByKey:
+    """Tests for the key-based merge helpers (_merge_env, _merge_ports,
+    _merge_tmpfs, _merge_volumes)."""
+
+    @pytest.mark.parametrize(
+        ("merge", "base", "override", "kept", "dropped"),
+        [
+            # env: keyed by variable name
+            pytest.param(
+                _merge_env,
+                ["KEY1=v1"],
+                ["KEY2=v2"],
+                ["KEY1=v1", "KEY2=v2"],
+                [],
+                id="env-no-conflict",
+            ),
+            pytest.param(
+                _merge_env,
+                ["KEY=v1"],
+                ["KEY=v2"],
+                ["KEY=v2"],
+                ["KEY=v1"],
+                id="env-same-key-override",
+            ),
+            pytest.param(
+                _merge_env,
+                ["VAR1=p1", "VAR2=p1", "VAR3=p1"],
+                ["VAR1=p2", "VAR2=p2"],
+                ["VAR1=p2", "VAR2=p2", "VAR3=p1"],
+                ["VAR1=p1", "VAR2=p1"],
+                id="env-mixed",
+            ),
+            # ports: keyed by host port
+            pytest.param(
+                _merge_ports,
+                ["8080:80"],
+                ["3000:3000"],
+                ["8080:80", "3000:3000"],
+                [],
+                id="ports-no-conflict",
+            ),
+            pytest.param(
+                _merge_ports,
+                ["8080:80"],
+                ["8080:8080"],
+                ["8080:8080"],
+                ["8080:80"],
+                id="ports-same-host-port-override",
+            ),
+            pytest.param(
+                _merge_ports,
+                ["8080"],
+                ["8080:80"],
+                ["8080:80"],
+                ["8080"],
+                id="ports-host-only",
+            ),
+            # tmpfs: keyed by path
+            pytest.param(
+                _merge_tmpfs,
+                ["/tmp:size=100m"],
+                ["/var/cache"],
+                ["/tmp:size=100m", "/var/cache"],
+                [],
+                id="tmpfs-no-conflict",
+            ),
+            pytest.param(
+                _merge_tmpfs,
+                ["/tmp:size=100m"],
+                ["/tmp:size=200m"],
+                ["/tmp:size=200m"],
+                ["/tmp:size=100m"],
+                id="tmpfs-same-path-override",
+            ),
+            pytest.param(
+                _merge_tmpfs,
+                ["/tmp:size=100m", "/var/cache:size=50m", "/run"],
+                ["/tmp:size=200m", "/run:size=100m"],
+                ["/tmp:size=200m", "/run:size=100m", "/var/cache:size=50m"],
+                ["/tmp:size=100m", "/run"],
+                id="tmpfs-mixed",
+            ),
+            # volumes: keyed by container path
+            pytest.param(
+                _merge_volumes,
+                ["./data:/app/data"],
+                ["./logs:/app/logs"],
+                ["./data:/app/data", "./logs:/app/logs"],
+                [],
+                id="volumes-no-conflict",
+            ),
+            pytest.param(
+                _merge_volumes,
+                ["./host1:/app/data"],
+                ["./host2:/app/data"],
+                ["./host2:/app/data"],
+                ["./host1:/app/data"],
+                id="volumes-same-container-path-override",
+            ),
+            pytest.param(
+                _merge_volumes,
+                ["./data:/app/data:ro"],
+                ["./new:/app/data:rw"],
+                ["./new:/app/data:rw"],
+                ["./data:/app/data:ro"],
+                id="volumes-with-options",
+            ),
+        ],
+    )
+    def test_merge(self, merge, base, override, kept, dropped):
+        """Overrides replace base entries with the same key; others are kept."""
+        result = merge(base, override)
+        for item in kept:
+            assert item in result
+        for item in dropped:
+            assert item not in result
 
     def test_merge_empty(self):
         """Empty lists handled correctly."""
-        from nix_devbox.config import _merge_tmpfs
-
         assert _merge_tmpfs([], ["/tmp"]) == ["/tmp"]
         assert _merge_tmpfs(["/tmp"], []) == ["/tmp"]
         assert _merge_tmpfs([], []) == []
 
 
-class TestMergeVolumes:
-    """Tests for _merge_volumes helper - container path based merging."""
-
-    def test_merge_no_conflict(self):
-        """Different container paths should be merged."""
-        from nix_devbox.config import _merge_volumes
-
-        result = _merge_volumes(["./data:/app/data"], ["./logs:/app/logs"])
-        assert "./data:/app/data" in result
-        assert "./logs:/app/logs" in result
-
-    def test_merge_same_container_path_override(self):
-        """Same container path should be overridden."""
-        from nix_devbox.config import _merge_volumes
-
-        result = _merge_volumes(["./host1:/app/data"], ["./host2:/app/data"])
-        assert "./host2:/app/data" in result
-        assert "./host1:/app/data" not in result
-
-    def test_merge_with_options(self):
-        """Container path with options."""
-        from nix_devbox.config import _merge_volumes
-
-        result = _merge_volumes(["./data:/app/data:ro"], ["./new:/app/data:rw"])
-        assert "./new:/app/data:rw" in result
-        assert "./data:/app/data:ro" not in result
-
-
 class TestMergeTwoConfigs:
     """Tests for _merge_two_configs."""
 
     def test_resources_override(self):
-        base = DevboxConfig.from_dict(
-            {"run": {"resources": {"memory": "512m", "cpus": "1.0"}}}
-        )
-        override = DevboxConfig.from_dict(
-            {"run": {"resources": {"memory": "1g"}}}  # Override memory
-        )
+        base = _cfg({"run": {"resources": {"memory": "512m", "cpus": "1.0"}}})
+        override = _cfg({"run": {"resources": {"memory": "1g"}}})  # Override memory
 
         merged = _merge_two_configs(base, override)
 
@@ -184,12 +180,10 @@ class TestMergeTwoConfigs:
         assert merged.run.resources.cpus == "1.0"  # Preserved
 
     def test_security_boolean_or(self):
-        base = DevboxConfig.from_dict(
+        base = _cfg(
             {"run": {"security": {"read_only": False, "no_new_privileges": False}}}
         )
-        override = DevboxConfig.from_dict(
-            {"run": {"security": {"no_new_privileges": True}}}
-        )
+        override = _cfg({"run": {"security": {"no_new_privileges": True}}})
 
         merged = _merge_two_configs(base, override)
 
@@ -197,7 +191,7 @@ class TestMergeTwoConfigs:
         assert merged.run.security.no_new_privileges is True
 
     def test_security_cap_merge(self):
-        base = DevboxConfig.from_dict(
+        base = _cfg(
             {
                 "run": {
                     "security": {
@@ -207,9 +201,7 @@ class TestMergeTwoConfigs:
                 }
             }
         )
-        override = DevboxConfig.from_dict(
-            {"run": {"security": {"cap_add": ["SYS_PTRACE"]}}}
-        )
+        override = _cfg({"run": {"security": {"cap_add": ["SYS_PTRACE"]}}})
 
         merged = _merge_two_configs(base, override)
 
@@ -218,19 +210,15 @@ class TestMergeTwoConfigs:
         assert "SYS_PTRACE" in merged.run.security.cap_add
 
     def test_logging_options_merge(self):
-        base = DevboxConfig.from_dict(
-            {"run": {"logging": {"options": {"max-size": "10m"}}}}
-        )
-        override = DevboxConfig.from_dict(
-            {"run": {"logging": {"options": {"max-file": "3"}}}}
-        )
+        base = _cfg({"run": {"logging": {"options": {"max-size": "10m"}}}})
+        override = _cfg({"run": {"logging": {"options": {"max-file": "3"}}}})
 
         merged = _merge_two_configs(base, override)
 
         assert merged.run.logging.options == {"max-size": "10m", "max-file": "3"}
 
     def test_lists_merge(self):
-        base = DevboxConfig.from_dict(
+        base = _cfg(
             {
                 "run": {
                     "ports": ["8080:80"],
@@ -240,7 +228,7 @@ class TestMergeTwoConfigs:
                 }
             }
         )
-        override = DevboxConfig.from_dict(
+        override = _cfg(
             {
                 "run": {
                     "ports": ["3000:3000"],
@@ -271,18 +259,14 @@ class TestMergeDevboxConfigs:
         assert result == DevboxConfig()
 
     def test_single_config_returns_self(self):
-        config = DevboxConfig.from_dict({"run": {"resources": {"memory": "1g"}}})
+        config = _cfg({"run": {"resources": {"memory": "1g"}}})
         result = merge_devbox_configs([config])
         assert result.run.resources.memory == "1g"
 
     def test_multiple_configs_merge_in_order(self):
-        config1 = DevboxConfig.from_dict(
-            {"run": {"resources": {"memory": "512m"}, "ports": ["8080:80"]}}
-        )
-        config2 = DevboxConfig.from_dict(
-            {"run": {"resources": {"cpus": "2.0"}, "ports": ["3000:3000"]}}
-        )
-        config3 = DevboxConfig.from_dict({"run": {"env": ["KEY=value"]}})
+        config1 = _cfg({"run": {"resources": {"memory": "512m"}, "ports": ["8080:80"]}})
+        config2 = _cfg({"run": {"resources": {"cpus": "2.0"}, "ports": ["3000:3000"]}})
+        config3 = _cfg({"run": {"env": ["KEY=value"]}})
 
         merged = merge_devbox_configs([config1, config2, config3])
 
@@ -294,8 +278,8 @@ class TestMergeDevboxConfigs:
 
     def test_image_override(self):
         """Later config's image should override earlier config's image."""
-        base = DevboxConfig.from_dict({"image": "base-image:latest"})
-        override = DevboxConfig.from_dict({"image": "override-image:v2"})
+        base = _cfg({"image": "base-image:latest"})
+        override = _cfg({"image": "override-image:v2"})
 
         merged = _merge_two_configs(base, override)
 
@@ -303,8 +287,8 @@ class TestMergeDevboxConfigs:
 
     def test_image_inheritance(self):
         """If override doesn't specify image, base's image should be used."""
-        base = DevboxConfig.from_dict({"image": "base-image:latest"})
-        override = DevboxConfig.from_dict({"run": {"resources": {"memory": "1g"}}})
+        base = _cfg({"image": "base-image:latest"})
+        override = _cfg({"run": {"resources": {"memory": "1g"}}})
 
         merged = _merge_two_configs(base, override)
 
@@ -312,26 +296,35 @@ class TestMergeDevboxConfigs:
 
     def test_multiple_configs_image_merge(self):
         """Image from last config should take precedence."""
-        config1 = DevboxConfig.from_dict({"image": "image1:v1"})
-        config2 = DevboxConfig.from_dict({"run": {"resources": {"memory": "512m"}}})
-        config3 = DevboxConfig.from_dict({"image": "image3:v3"})
+        config1 = _cfg({"image": "image1:v1"})
+        config2 = _cfg({"run": {"resources": {"memory": "512m"}}})
+        config3 = _cfg({"image": "image3:v3"})
 
         merged = merge_devbox_configs([config1, config2, config3])
 
         assert merged.image == "image3:v3"
 
+    def test_same_configs_reuse_merge_result(self):
+        """Merging the same config objects again returns the cached result."""
+        config1 = _cfg({"run": {"ports": ["8080:80"]}})
+        config2 = _cfg({"run": {"ports": ["3000:3000"]}})
+
+        first = merge_devbox_configs([config1, config2])
+        second = merge_devbox_configs([config1, config2])
+
+        assert second is first
+        assert merge_devbox_configs([config2, config1]) is not first
+
 
 class TestMergeInitConfig:
     """Tests for init configuration merging."""
 
     def test_init_commands_merge(self):
         """Init commands should be merged (not overridden)."""
-        base = DevboxConfig.from_dict(
+        base = _cfg(
             {"init": {"commands": ["mkdir -p /workspace", "chmod 777 /workspace"]}}
         )
-        override = DevboxConfig.from_dict(
-            {"init": {"commands": ["mkdir -p /build", "chmod 777 /build"]}}
-        )
+        override = _cfg({"init": {"commands": ["mkdir -p /build", "chmod 777 /build"]}})
 
         merged = _merge_two_configs(base, override)
 
@@ -343,8 +336,8 @@ class TestMergeInitConfig:
 
     def test_init_commands_deduplication(self):
         """Duplicate commands should be removed."""
-        base = DevboxConfig.from_dict({"init": {"commands": ["mkdir -p /workspace"]}})
-        override = DevboxConfig.from_dict(
+        base = _cfg({"init": {"commands": ["mkdir -p /workspace"]}})
+        override = _cfg(
             {"init": {"commands": ["mkdir -p /workspace", "chmod 777 /build"]}}
         )
 
@@ -356,9 +349,9 @@ class TestMergeInitConfig:
 
     def test_multiple_configs_init_merge(self):
         """Multiple configs should merge init commands in order."""
-        config1 = DevboxConfig.from_dict({"init": {"commands": ["echo 'config1'"]}})
-        config2 = DevboxConfig.from_dict({"init": {"commands": ["echo 'config2'"]}})
-        config3 = DevboxConfig.from_dict({"init": {"commands": ["echo 'config3'"]}})
+        config1 = _cfg({"init": {"commands": ["echo 'config1'"]}})
+        config2 = _cfg({"init": {"commands": ["echo 'config2'"]}})
+        config3 = _cfg({"init": {"commands": ["echo 'config3'"]}})
 
         merged = merge_devbox_configs([config1, config2, config3])
 
@@ -369,8 +362,8 @@ class TestMergeInitConfig:
 
     def test_empty_init_config(self):
         """Empty init config should not affect merged result."""
-        base = DevboxConfig.from_dict({"init": {"commands": ["mkdir -p /workspace"]}})
-        override = DevboxConfig.from_dict({})  # No init config
+        base = _cfg({"init": {"commands": ["mkdir -p /workspace"]}})
+        override = _cfg({})  # No init config
 
         merged = _merge_two_configs(base, override)
 
@@ -379,13 +372,13 @@ class TestMergeInitConfig:
 
     def test_run_and_init_config_together(self):
         """Both run and init configs should be merged correctly."""
-        config1 = DevboxConfig.from_dict(
+        config1 = _cfg(
             {
                 "run": {"resources": {"memory": "1g"}},
                 "init": {"commands": ["mkdir -p /workspace"]},
             }
         )
-        config2 = DevboxConfig.from_dict(
+        config2 = _cfg(
             {
                 "run": {"resources": {"cpus": "2.0"}},
                 "init": {"commands": ["chmod 777 /workspace"]},
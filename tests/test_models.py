@@ -0,0 +1,268 @@
+"""Tests for domain models."""
+
+import json
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+from nix_devbox.models import (
+    DEFAULT_SHELL_ATTR,
+    DEFAULT_TAG,
+    FlakeRef,
+    FlakeURI,
+    ImageRef,
+    RemoteFlakeFetcher,
+)
+
+
+class TestFlakeRefParse:
+    """Tests for FlakeRef.parse."""
+
+    def test_parse_local_path(self):
+        ref = FlakeRef.parse("/path/to/project")
+        assert ref.url == "path:/path/to/project"
+        assert ref.shell == DEFAULT_SHELL_ATTR
+
+    def test_parse_shell_name(self):
+        ref = FlakeRef.parse("/path/to/project#nodejs")
+        assert ref.shell == "devShells.${system}.nodejs"
+
+    def test_parse_is_cached(self):
+        assert FlakeRef.parse("/path/to/project") is FlakeRef.parse("/path/to/project")
+
+    def test_relative_path_cache_follows_cwd(self, tmp_path, monkeypatch):
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+
+        monkeypatch.chdir(tmp_path / "a")
+        first = FlakeRef.parse(".")
+        monkeypatch.chdir(tmp_path / "b")
+        second = FlakeRef.parse(".")
+
+        assert first.url == f"path:{os.path.realpath(tmp_path / 'a')}"
+        assert second.url == f"path:{os.path.realpath(tmp_path / 'b')}"
+
+
+class TestFlakeURIParse:
+    """Tests for FlakeURI.parse."""
+
+    @pytest.mark.parametrize(
+        ("ref", "subdir"),
+        [
+            ("github:owner/repo", None),
+            ("github:owner/repo?dir=sub", "sub"),
+            ("github:owner/repo?ref=main&dir=a%2Fb", "a/b"),
+            ("github:owner/repo?dir=&dir=second", "second"),
+            ("git+https://example.com/repo?dir", None),
+        ],
+    )
+    def test_remote_subdir(self, ref, subdir):
+        uri = FlakeURI.parse(ref)
+        assert uri.subdir == subdir
+        assert uri.url == ref
+        assert not uri.is_local
+
+    @pytest.mark.parametrize(
+        "ref", ["/path/to/project", "/path/to/../to/project", "/path//to/project/"]
+    )
+    def test_local_path_normalized(self, ref):
+        uri = FlakeURI.parse(ref)
+        assert uri.url == "path:/path/to/project"
+        assert uri.is_local
+
+    def test_local_symlink_resolved(self, tmp_path, monkeypatch):
+        (tmp_path / "real").mkdir()
+        (tmp_path / "link").symlink_to(tmp_path / "real")
+        monkeypatch.chdir(tmp_path)
+
+        expected = f"path:{os.path.realpath(tmp_path / 'real')}"
+        assert FlakeURI.parse(str(tmp_path / "link")).url == expected
+        assert FlakeURI.parse("./link").url == expected
+
+    def test_parse_is_cached(self):
+        assert FlakeURI.parse("github:owner/repo") is FlakeURI.parse(
+            "github:owner/repo"
+        )
+
+
+class TestImageRefParse:
+    """Tests for ImageRef.parse."""
+
+    def test_parse_name_and_tag(self):
+        ref = ImageRef.parse("myimage:v1")
+        assert (ref.name, ref.tag) == ("myimage", "v1")
+
+    def test_parse_is_cached(self):
+        assert ImageRef.parse("myimage:v1") is ImageRef.parse("myimage:v1")
+
+    def test_parse_default_tag(self):
+        assert ImageRef.parse("myimage").tag == DEFAULT_TAG
+
+    @pytest.mark.parametrize(
+        ("value", "name", "tag"),
+        [
+            ("localhost:5000/image:v1", "localhost:5000/image", "v1"),
+            ("localhost:5000/image", "localhost:5000/image", DEFAULT_TAG),
+        ],
+    )
+    def test_parse_registry_port(self, value, name, tag):
+        ref = ImageRef.parse(value)
+        assert (ref.name, ref.tag) == (name, tag)
+
+    def test_parse_strips_whitespace(self):
+        ref = ImageRef.parse("  myimage:v1\n")
+        assert (ref.name, ref.tag) == ("myimage", "v1")
+
+    @pytest.mark.parametrize("value", ["", "   "])
+    def test_parse_empty(self, value):
+        with pytest.raises(ValueError, match="cannot be empty"):
+            ImageRef.parse(value)
+
+    def test_parse_overrides(self):
+        ref = ImageRef.parse("myimage:v1", name_override="other", tag_override="v2")
+        assert str(ref) == "other:v2"
+
+    def test_parse_both_overrides_ignore_value(self):
+        ref = ImageRef.parse("", name_override="other", tag_override="v2")
+        assert str(ref) == "other:v2"
+
+    def test_registry_name_accepted(self):
+        ref = ImageRef(name="ghcr.io/owner/image", tag="1.0.0-rc.1")
+        assert str(ref) == "ghcr.io/owner/image:1.0.0-rc.1"
+
+    @pytest.mark.parametrize(
+        ("name", "tag"),
+        [('foo"; evil', "latest"), ("foo", 'v1"; evil'), ("foo", "${x}"), ("", "v1")],
+    )
+    def test_invalid_reference_rejected(self, name, tag):
+        with pytest.raises(ValueError, match="Invalid image"):
+            ImageRef(name=name, tag=tag)
+
+
+class TestRemoteFlakeFetcher:
+    """Tests for RemoteFlakeFetcher caching."""
+
+    URL = "github:owner/repo"
+
+    @pytest.fixture
+    def prefetch_calls(self, tmp_path, monkeypatch):
+        """Replace `nix flake prefetch` with a fake that records its URLs."""
+        store_path = tmp_path / "store" / "abc-source"
+        store_path.mkdir(parents=True)
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd[-1])
+            if "broken" in cmd[-1]:
+                raise subprocess.CalledProcessError(1, cmd, stderr=b"error")
+            stdout = json.dumps({"storePath": str(store_path)}).encode()
+            return subprocess.CompletedProcess(cmd, 0, stdout=stdout, stderr=b"")
+
+        monkeypatch.setattr("nix_devbox.models.subprocess.run", fake_run)
+        return calls
+
+    def test_persisted_result_reused_across_instances(self, tmp_path, prefetch_calls):
+        """A new fetcher with the same cache file does not prefetch again."""
+        cache_file = tmp_path / "cache" / "fetch-cache.json"
+
+        first = RemoteFlakeFetcher(cache_file).fetch(self.URL)
+        second = RemoteFlakeFetcher(cache_file).fetch(self.URL)
+
+        assert first == second
+        assert prefetch_calls == [self.URL]
+
+    def test_removed_store_path_refetched(self, tmp_path, prefetch_calls):
+        """A persisted store path that no longer exists is fetched again."""
+        cache_file = tmp_path / "fetch-cache.json"
+        entry = {"storePath": str(tmp_path / "gone"), "fetchedAt": time.time()}
+        cache_file.write_text(json.dumps({self.URL: entry}))
+
+        RemoteFlakeFetcher(cache_file).fetch(self.URL)
+
+        assert prefetch_calls == [self.URL]
+
+    def test_fetch_many(self, prefetch_calls):
+        """Each distinct URL is prefetched once and failures are left out."""
+        fetcher = RemoteFlakeFetcher()
+        fetcher.fetch(self.URL)
+        urls = [self.URL, "github:owner/other", "github:owner/third"]
+
+        result = fetcher.fetch_many([*urls, "github:owner/broken", urls[1]])
+
+        assert list(result) == urls
+        assert sorted(prefetch_calls) == sorted([*urls, "github:owner/broken"])
+
+    def test_failed_fetch_not_retried(self, prefetch_calls):
+        """fetch() after a failed fetch_many raises without prefetching again."""
+        fetcher = RemoteFlakeFetcher()
+        fetcher.fetch_many(["github:owner/broken", "github:owner/broken-too"])
+
+        for url in ("github:owner/broken", "github:owner/broken-too"):
+            with pytest.raises(RuntimeError, match=url):
+                fetcher.fetch(url)
+        assert sorted(prefetch_calls) == [
+            "github:owner/broken",
+            "github:owner/broken-too",
+        ]
+
+    def test_expired_failure_retried(self, prefetch_calls, monkeypatch):
+        """A failure older than FETCH_FAILURE_TTL is fetched again."""
+        monkeypatch.setattr("nix_devbox.models.FETCH_FAILURE_TTL", 0)
+        fetcher = RemoteFlakeFetcher()
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                fetcher.fetch("github:owner/broken")
+        assert prefetch_calls == ["github:owner/broken"] * 2
+
+    def test_get_file_path_cached(self, prefetch_calls):
+        """Repeated lookups of the same file reuse the first result."""
+        fetcher = RemoteFlakeFetcher()
+        store_path = fetcher.fetch(self.URL)
+        (store_path / "devbox.yaml").touch()
+
+        found = fetcher.get_file_path(self.URL, "devbox.yaml")
+        (store_path / "devbox.yaml").unlink()
+
+        assert fetcher.get_file_path(self.URL, "devbox.yaml") == found
+        assert fetcher.get_file_path(self.URL, "missing.yaml") is None
+        assert prefetch_calls == [self.URL]
+
+    def test_fetch_failure_reports_stderr(self, prefetch_calls):
+        """A failed prefetch raises RuntimeError carrying nix's stderr."""
+        with pytest.raises(RuntimeError, match="github:owner/broken: error"):
+            RemoteFlakeFetcher().fetch("github:owner/broken")
+
+    def test_concurrent_fetches_share_one_prefetch(self, tmp_path, monkeypatch):
+        """Callers fetching a URL that is already being fetched wait for it."""
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_run(cmd, **kwargs):
+            calls.append(cmd[-1])
+            started.set()
+            release.wait(timeout=5)
+            stdout = json.dumps({"storePath": str(tmp_path)}).encode()
+            return subprocess.CompletedProcess(cmd, 0, stdout=stdout, stderr=b"")
+
+        monkeypatch.setattr("nix_devbox.models.subprocess.run", slow_run)
+        fetcher = RemoteFlakeFetcher()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(fetcher.fetch(self.URL)))
+            for _ in range(3)
+        ]
+        threads[0].start()
+        started.wait(timeout=5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert results == [tmp_path] * 3
+        assert calls == [self.URL]
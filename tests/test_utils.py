@@ -1,6 +1,8 @@
 """Tests for utility functions."""
 
-from nix_devbox.utils import expand_flagged_options
+import pytest
+
+from nix_devbox.utils import expand_flagged_options, extract_part_by_separator
 
 
 class TestExpandFlaggedOptions:
@@ -35,3 +37,33 @@ class TestExpandFlaggedOptions:
         # Short flags
         result = expand_flagged_options("-v", ["/data:/data"])
         assert result == ["-v", "/data:/data"]
+
+
+class TestExtractPartBySeparator:
+    """Tests for extract_part_by_separator utility function."""
+
+    @pytest.mark.parametrize("index", [0, 1, 2, 3, 5])
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "./host:/container:ro",
+            "/tmp:size=100m",
+            "no-separator",
+            "a::b",
+            ":leading",
+            "trailing:",
+            "::",
+            "",
+        ],
+    )
+    def test_matches_split(self, value, index):
+        """Test it agrees with str.split, falling back to the whole value."""
+        parts = value.split(":")
+        expected = parts[index] if len(parts) > index else value
+        assert extract_part_by_separator(value, ":", index) == expected
+
+    def test_multi_character_separator(self):
+        """Test separators longer than one character."""
+        assert extract_part_by_separator("a::b::c", "::", 1) == "b"
+        assert extract_part_by_separator("a::b::c", "::", 2) == "c"
+        assert extract_part_by_separator("a::b", "::", 2) == "a::b"